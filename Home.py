@@ -1,64 +1,288 @@
+import math
 import pathlib
 import datetime
 import sqlite3
+import contextlib
+import collections
 
 import streamlit as st
 import pandas as pd
+import altair as alt
+
+from compute import LEADERS
 
 DB = pathlib.Path("2kaveragejoes.sqlite3")
 
 
+# Upper bound on cached query results; entries for superseded data versions
+# are evicted first since nothing asks for them again.
+CACHE_ENTRIES = 64
+
+
+# `cache_data` and `cache_resource` arrived in Streamlit 1.18; the locked
+# 1.11 has the same caches as `experimental_memo` and `experimental_singleton`.
+cache_data = getattr(st, "cache_data", None) or st.experimental_memo
+cache_resource = getattr(st, "cache_resource", None) or st.experimental_singleton
+
+
 def get_database_connection():
     return sqlite3.connect(DB, check_same_thread=False)
 
 
-def get_standings(conn):
-    df = pd.read_sql_query("SELECT * from Standings", conn)
-    df = df.drop('index', axis=1)
+def data_version():
+    # Every publish rewrites the database file, so its mtime identifies the
+    # data currently being served without having to open SQLite.
+    return DB.stat().st_mtime_ns
+
+
+@cache_resource
+def cache_counters():
+    return collections.Counter()
+
+
+@cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def query_table(name, season, version):
+    cache_counters()["misses"] += 1
+    with contextlib.closing(get_database_connection()) as conn:
+        # Tables are partitioned (and indexed) by season; only read one.
+        return pd.read_sql_query(
+            f'SELECT * from "{name}" WHERE "Season" = ?', conn, params=(season,)
+        )
+
+
+def read_table(name, season):
+    cache_counters()["reads"] += 1
+    return query_table(name, season, data_version())
+
+
+@cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def query_rows(name, season, where, order, version):
+    cache_counters()["misses"] += 1
+    # Only the rows asked for are read (through the table's index on
+    # `Season` and the `where` columns) and cached, not the whole season.
+    filters, params = ['"Season" = ?'], [season]
+    for column, value in where:
+        filters.append(f'"{column}" = ?')
+        params.append(value)
+    columns = ", ".join(f'"{c}"' for c in order)
+    order = f" ORDER BY {columns}" if order else ""
+
+    with contextlib.closing(get_database_connection()) as conn:
+        return pd.read_sql_query(
+            f'SELECT * from "{name}" WHERE {" AND ".join(filters)}{order}', conn, params=params
+        )
+
+
+def read_rows(name, season, order=(), **where):
+    cache_counters()["reads"] += 1
+    # Keys often come out of a DataFrame; SQLite only binds plain values.
+    where = tuple((c, v.item() if hasattr(v, "item") else v) for c, v in where.items())
+    return query_rows(name, season, where, tuple(order), data_version())
+
+
+@cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def query_seasons(version):
+    cache_counters()["misses"] += 1
+    with contextlib.closing(get_database_connection()) as conn:
+        df = pd.read_sql_query('SELECT DISTINCT "Season" from "Teams" ORDER BY "Season"', conn)
+    return list(df["Season"])
+
+
+def get_seasons():
+    cache_counters()["reads"] += 1
+    return query_seasons(data_version())
+
+
+# Games shown per page of a game log.
+PAGE = 10
+
+
+@cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def query_page(name, season, team, before, limit, version):
+    cache_counters()["misses"] += 1
+    # Keyset pagination: a page starts just past the (Date, Order) key that
+    # ended the one before it, so every page is one range read of the
+    # table's index however far back it is.
+    filters, params = ['"Season" = ?'], [season]
+    if team is not None:
+        filters.append('"Team" = ?')
+        params.append(team)
+    if before is not None:
+        filters.append('("Date", "Order") < (?, ?)')
+        params.extend(before)
+
+    with contextlib.closing(get_database_connection()) as conn:
+        return pd.read_sql_query(
+            f'SELECT * from "{name}" WHERE {" AND ".join(filters)} '
+            f'ORDER BY "Date" DESC, "Order" DESC LIMIT ?',
+            conn,
+            params=(*params, limit),
+        )
+
+
+def read_page(name, season, team=None, before=None, limit=PAGE):
+    cache_counters()["reads"] += 1
+    return query_page(name, season, team, before, limit, data_version())
+
+
+def cache_info():
+    counters = cache_counters()
+    return {
+        "hits": counters["reads"] - counters["misses"],
+        "misses": counters["misses"],
+        "entries": CACHE_ENTRIES,
+    }
+
+
+def get_standings(season):
+    df = read_table("Standings", season)
+    df = df.drop(['Season'], axis=1)
     df.index = df.index + 1
     return df
 
 
-def get_highs(conn):
-    df = pd.read_sql_query("SELECT * from Highs", conn)
-    df = df.drop('index', axis=1)
+def get_ratings(season):
+    df = read_table("Ratings", season)
+    df = df.drop(['Season'], axis=1)
     df.index = df.index + 1
     return df
 
 
-def get_team_summary(conn):
-    df = pd.read_sql_query("SELECT * from Team", conn)
-    df = df.drop('index', axis=1)
+def get_rating_history(season):
+    return read_table("RatingHistory", season).drop(['Season'], axis=1)
+
+
+def rating_chart(history):
+    return (
+        alt.Chart(history)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("Order:Q", title="Game"),
+            y=alt.Y("After:Q", title="Elo", scale=alt.Scale(zero=False)),
+            color="Team:N",
+            tooltip=["Team", "Date", "Opponent", "PTS", "OPP", "After"],
+        )
+    )
+
+
+def get_odds(season):
+    df = read_table("Odds", season)
+    df = df.drop(['Season'], axis=1)
     df.index = df.index + 1
     return df
 
 
-def get_opp_summary(conn):
-    df = pd.read_sql_query("SELECT * from Opponent", conn)
-    df = df.drop('index', axis=1)
+def get_highs(season):
+    df = read_table("Highs", season)
+    df = df.drop(['Season'], axis=1)
     df.index = df.index + 1
     return df
 
 
-def get_diff_summary(conn):
-    df = pd.read_sql_query("SELECT * from Differential", conn)
-    df = df.drop('index', axis=1)
+def get_team_summary(season):
+    df = read_table("Team", season)
+    df = df.drop(['Season'], axis=1)
     df.index = df.index + 1
     return df
 
 
-def get_leaders(stat, gp, conn):
-    df = pd.read_sql_query(f"SELECT * from {stat}", conn)
-    df = df.drop('index', axis=1)
-    df = df[(df["GP"] >= gp)]
-    df = df.head(10)
+def get_opp_summary(season):
+    df = read_table("Opponent", season)
+    df = df.drop(['Season'], axis=1)
+    df.index = df.index + 1
+    return df
+
+
+def get_diff_summary(season):
+    df = read_table("Differential", season)
+    df = df.drop(['Season'], axis=1)
+    df.index = df.index + 1
+    return df
+
+
+def get_team_advanced(season):
+    df = read_table("TeamAdvanced", season)
+    df = df.drop(['Season'], axis=1)
+    df.index = df.index + 1
+    return df
+
+
+def get_groups(season):
+    df = read_table("Teams", season)
+    return df.groupby("Group")["Team"].apply(list).to_dict()
+
+
+def get_games(season, before=None, limit=PAGE):
+    df = read_page("Games", season, before=before, limit=limit)
+    return df.drop(['Season'], axis=1)
+
+
+def get_schedule(team, season, before=None, limit=PAGE):
+    df = read_page("Schedule", season, team=team, before=before, limit=limit)
+    return df.drop(['Season', 'Team'], axis=1)
+
+
+def game_log(key, fetch):
+    # Pages through a newest-first log with Newer/Older buttons. The keys
+    # that started each earlier page are kept, so going back is a keyset
+    # read too; one extra row is fetched to tell whether there's an older
+    # page.
+    starts = st.session_state.setdefault(key, [None])
+    df = fetch(starts[-1], PAGE + 1)
+    page = df.head(PAGE).reset_index(drop=True)
+
+    if page.empty:
+        st.info("No games recorded yet.")
+        return
+
+    st.table(page)
+    last = (str(page["Date"].iloc[-1]), int(page["Order"].iloc[-1]))
+    newer, older = st.columns(2)
+    newer.button("Newer", key=f"{key}-newer", disabled=len(starts) == 1, on_click=starts.pop)
+    older.button(
+        "Older",
+        key=f"{key}-older",
+        disabled=len(df) <= PAGE,
+        on_click=starts.append,
+        args=(last,),
+    )
+
+
+@cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def query_boards(season, version):
+    cache_counters()["misses"] += 1
+    # Every (Stat, MinGP) board of a season is a few hundred rows; read them
+    # in one query and split them up once, so moving the GP slider only
+    # looks up a cached board.
+    with contextlib.closing(get_database_connection()) as conn:
+        df = pd.read_sql_query(
+            'SELECT * from "Leaders" WHERE "Season" = ? ORDER BY "Stat", "MinGP", "Rank"',
+            conn,
+            params=(season,),
+        )
+    return {key: board for key, board in df.groupby(["Stat", "MinGP"])}
+
+
+def read_board(stat, gp, season):
+    cache_counters()["reads"] += 1
+    boards = query_boards(season, data_version())
+    # A minimum nobody meets has no rows: an empty board.
+    return boards.get((stat, gp), pd.DataFrame(columns=["Player", "GP", "Value", "Made"]))
+
+
+def get_leaders(stat, gp, season):
+    column, made = LEADERS[stat]
+
+    df = read_board(stat, gp, season)
+    df = df.rename(columns={"Value": column, "Made": made})
+    df = df[["Player", "GP", column] + ([made] if made else [])]
     df = df.reset_index(drop=True)
     df.index = df.index + 1
     return df
 
 
 if __name__ == "__main__":
-    m_timestamp = DB.stat().st_mtime
+    m_timestamp = data_version() / 1e9
     m_time = datetime.datetime.fromtimestamp(m_timestamp)
     m_day = m_time.strftime("%m/%d/%Y")
 
@@ -97,40 +321,47 @@ if __name__ == "__main__":
         """
     )
 
-    db = get_database_connection()
+    seasons = get_seasons()
+    SEASON = st.selectbox("Season", seasons, index=len(seasons) - 1)
 
     st.header("Season Standings")
-    standings_df = get_standings(db)
+    standings_df = get_standings(SEASON)
 
-    tab1, tab2 = st.tabs(["Overall", "By Group"])
+    tab1, tab2, tab7, tab8 = st.tabs(["Overall", "By Group", "Power Ratings", "Playoff Odds"])
     tab1.table(standings_df.style.format({"PCT": "{:.2f}", "Margin": "{:.2f}"}))
 
-    g1_col, g2_col = tab2.columns(2)
-
-    g1_col.caption("Group A")
-    standings_a = standings_df.loc[standings_df['Team'].isin(["Blood Tigers", "Mudkats", "Eagles"])]
-    standings_a = standings_a.reset_index(drop=True)
-    g1_col.table(standings_a.style.format({"PCT": "{:.2f}", "Margin": "{:.2f}"}))
-
-    g1_col.caption("Group B")
-    standings_b = standings_df.loc[standings_df['Team'].isin(["CT6", "J2K", "Mambas"])]
-    standings_b = standings_b.reset_index(drop=True)
-    g1_col.table(standings_b.style.format({"PCT": "{:.2f}", "Margin": "{:.2f}"}))
-
-    g2_col.caption("Group C")
-    standings_c = standings_df.loc[standings_df['Team'].isin(["Kamikaze", "Hollywood", "Brick City"])]
-    standings_c = standings_c.reset_index(drop=True)
-    g2_col.table(standings_c.style.format({"PCT": "{:.2f}", "Margin": "{:.2f}"}))
+    groups = get_groups(SEASON)
+    g_cols = tab2.columns(2)
+    per_col = max(1, math.ceil(len(groups) / len(g_cols)))
+
+    for i, (group, members) in enumerate(sorted(groups.items())):
+        g_col = g_cols[i // per_col]
+        g_col.caption(f"Group {group}")
+        standings_g = standings_df.loc[standings_df['Team'].isin(members)]
+        standings_g = standings_g.reset_index(drop=True)
+        g_col.table(standings_g.style.format({"PCT": "{:.2f}", "Margin": "{:.2f}"}))
+
+    ratings_df = get_ratings(SEASON)
+    tab7.table(ratings_df.style.format({"Elo": "{:.0f}", "Change": "{:+.1f}"}))
+    history = get_rating_history(SEASON)
+    if not history.empty:
+        tab7.altair_chart(rating_chart(history), use_container_width=True)
+
+    odds_df = get_odds(SEASON)
+    odds = [c for c in odds_df.columns if c == "Playoffs" or c == "Group Title" or c.startswith("Seed ")]
+    tab8.dataframe(odds_df.style.format({"Proj": "{:.1f}", **{c: "{:.1%}" for c in odds}}))
+    tab8.caption(
+        "The rest of the season simulated many times over from the current power ratings. "
+        "Group winners are seeded first."
+    )
 
-    g2_col.caption("Group D")
-    standings_d = standings_df.loc[standings_df['Team'].isin(["Deathrow", "Savage Air", "BMB"])]
-    standings_d = standings_d.reset_index(drop=True)
-    g2_col.table(standings_d.style.format({"PCT": "{:.2f}", "Margin": "{:.2f}"}))
+    st.header("Recent Games")
+    game_log(f"games-{SEASON}", lambda before, limit: get_games(SEASON, before, limit))
 
     st.header(f"Team Stats")
-    tab3, tab4, tab5 = st.tabs(["Team", "Opponent", "Differential"])
+    tab3, tab4, tab5, tab6 = st.tabs(["Team", "Opponent", "Differential", "Advanced"])
 
-    team_df = get_team_summary(db)
+    team_df = get_team_summary(SEASON)
     tab3.dataframe(team_df.style.format({
         "FGM": "{:.2f}",
         "FGA": "{:.2f}",
@@ -146,7 +377,7 @@ if __name__ == "__main__":
         "PTS": "{:.2f}",
     }))
 
-    opp_df = get_opp_summary(db)
+    opp_df = get_opp_summary(SEASON)
     tab4.dataframe(opp_df.style.format({
         "FGM": "{:.2f}",
         "FGA": "{:.2f}",
@@ -162,7 +393,7 @@ if __name__ == "__main__":
         "PTS": "{:.2f}",
     }))
 
-    diff_df = get_diff_summary(db)
+    diff_df = get_diff_summary(SEASON)
     tab5.dataframe(diff_df.style.format({
         "FGM": "{:.2f}",
         "FGA": "{:.2f}",
@@ -178,6 +409,21 @@ if __name__ == "__main__":
         "PTS": "{:.2f}",
     }))
 
+    adv_df = get_team_advanced(SEASON)
+    tab6.dataframe(adv_df.style.format({
+        "Pace": "{:.1f}",
+        "ORtg": "{:.1f}",
+        "DRtg": "{:.1f}",
+        "Net": "{:.1f}",
+        "eFG%": "{:.2f}",
+        "OeFG%": "{:.2f}",
+        "AST/TO": "{:.2f}",
+    }))
+    tab6.caption(
+        "Possessions are estimated as FGA + TO + 0.44 × free throws made; "
+        "ratings are points scored and allowed per 100 of them."
+    )
+
     st.header(f"Individual Stats")
     MIN_GP = st.slider('Minimum games', 1, 15, value=4)
     off_col, def_col = st.columns(2)
@@ -185,39 +431,39 @@ if __name__ == "__main__":
     # Offense
 
     off_col.caption("Points Per Game")
-    pts_df = get_leaders("PTS", MIN_GP, db)
+    pts_df = get_leaders("PTS", MIN_GP, SEASON)
     off_col.table(pts_df.style.format({"PTS": "{:.2f}"}))
 
     off_col.caption("Assists Per Game")
-    ast_df = get_leaders("AST", MIN_GP, db)
+    ast_df = get_leaders("AST", MIN_GP, SEASON)
     off_col.table(ast_df.style.format({"AST": "{:.2f}"}))
 
     off_col.caption("3 Pointers Per Game")
-    tpm_df = get_leaders("TPG", MIN_GP, db)
+    tpm_df = get_leaders("TPG", MIN_GP, SEASON)
     off_col.table(tpm_df.style.format({"3PG": "{:.2f}"}))
 
     off_col.caption("3 Point %")
-    tpp_df = get_leaders("TPP", MIN_GP, db)
+    tpp_df = get_leaders("TPP", MIN_GP, SEASON)
     off_col.table(tpp_df.style.format({"3P%": "{:.2f}", "3PM": "{:.0f}"}))
 
     # Defense
 
     def_col.caption("Rebounds Per Game")
-    reb_df = get_leaders("REB", MIN_GP, db)
+    reb_df = get_leaders("REB", MIN_GP, SEASON)
     def_col.table(reb_df.style.format({"TRB": "{:.2f}"}))
 
     def_col.caption("Blocks Per Game")
-    blk_df = get_leaders("BLK", MIN_GP, db)
+    blk_df = get_leaders("BLK", MIN_GP, SEASON)
     def_col.table(blk_df.style.format({"BLK": "{:.2f}"}))
 
     def_col.caption("Steals Per Game")
-    stl_df = get_leaders("STL", MIN_GP, db)
+    stl_df = get_leaders("STL", MIN_GP, SEASON)
     def_col.table(stl_df.style.format({"STL": "{:.2f}"}))
 
     def_col.caption("Field Goal %")
-    fgp_df = get_leaders("FGP", MIN_GP, db)
+    fgp_df = get_leaders("FGP", MIN_GP, SEASON)
     def_col.table(fgp_df.style.format({"FG%": "{:.2f}", "FGM": "{:.0f}"}))
 
     st.header("Season Records")
-    highs_df = get_highs(db)
+    highs_df = get_highs(SEASON)
     st.table(highs_df)
@@ -0,0 +1,244 @@
+import gzip
+import json
+import sqlite3
+import hashlib
+import argparse
+import pathlib
+import threading
+import contextlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from compute import LEADERS
+
+DB = pathlib.Path("2kaveragejoes.sqlite3")
+
+# Endpoint -> published table. Every response body is built (and
+# compressed) once per data version, then served from memory.
+TABLES = {
+    "standings": "Standings",
+    "team": "Team",
+    "opponent": "Opponent",
+    "differential": "Differential",
+    "highs": "Highs",
+    "games": "Games",
+    "players": "Players",
+    "ratings": "Ratings",
+    "odds": "Odds",
+    "advanced": "TeamAdvanced",
+}
+# Endpoints that also take `?team=`, answered from these tables.
+BY_TEAM = {
+    "players": "Players",
+    "games": "Schedule",
+    "advanced": "Advanced",
+}
+
+# Bodies smaller than this aren't worth compressing.
+MIN_GZIP = 512
+
+
+def data_version(db=None):
+    # Every publish rewrites the database file (see Home.data_version).
+    return (db or DB).stat().st_mtime_ns
+
+
+class Body:
+    # Each encoding is its own representation, with its own strong tag.
+    def __init__(self, df):
+        self.json = df.to_json(orient="records").encode()
+        self.etag = f'"{hashlib.sha1(self.json).hexdigest()[:20]}"'
+        self.gzip = gzip.compress(self.json, mtime=0) if len(self.json) >= MIN_GZIP else None
+        self.gzip_etag = f'{self.etag[:-1]}-gz"' if self.gzip is not None else None
+
+
+def accepts_gzip(header):
+    # `Accept-Encoding: gzip;q=0` (or `*;q=0`) turns it off again.
+    quality = {}
+    for coding in header.split(","):
+        name, _, params = coding.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        quality[name.strip().lower()] = q
+    return quality.get("gzip", quality.get("*", 0.0)) > 0
+
+
+def matches(header, etag):
+    # If-None-Match compares weakly: `W/` prefixes don't matter, and any tag
+    # in the list (or `*`) is a match.
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def build(db):
+    # Every response for the current data, keyed by (endpoint, season, key).
+    bodies = {}
+    with contextlib.closing(sqlite3.connect(db)) as conn:
+
+        def read(table):
+            return pd.read_sql_query(f'SELECT * FROM "{table}"', conn)
+
+        seasons = sorted(read("Teams")["Season"].unique().tolist())
+        bodies[("seasons", None, None)] = Body(pd.DataFrame({"Season": seasons}))
+        bodies[("career", None, None)] = Body(read("Career"))
+
+        for endpoint, table in TABLES.items():
+            df = read(table)
+            if endpoint == "games":
+                df = df.sort_values(["Season", "Date", "Order"], ascending=False)
+            for season, sdf in df.groupby("Season"):
+                bodies[(endpoint, season, None)] = Body(sdf.drop(columns=["Season"]))
+
+        for endpoint, table in BY_TEAM.items():
+            df = read(table)
+            if endpoint == "games":
+                df = df.sort_values(["Season", "Team", "Date", "Order"], ascending=False)
+            for (season, team), tdf in df.groupby(["Season", "Team"]):
+                bodies[(endpoint, season, team)] = Body(tdf.drop(columns=["Season", "Team"]))
+
+        df = read("Leaders").sort_values(["Season", "Stat", "MinGP", "Rank"])
+        for (season, stat, gp), ldf in df.groupby(["Season", "Stat", "MinGP"]):
+            bodies[("leaders", season, (stat, gp))] = Body(ldf.drop(columns=["Season", "Stat", "MinGP"]))
+
+    return seasons, bodies
+
+
+class Snapshot:
+    # The bodies for one data version. Rebuilt (by one thread, while the
+    # rest wait) the first time a request sees the database has changed.
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.version = None
+        self.seasons = []
+        self.bodies = {}
+        self.builds = 0
+
+    def current(self):
+        version = data_version(self.db)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.seasons, self.bodies = build(self.db)
+                    self.version = version
+                    self.builds += 1
+        return self
+
+
+class Handler(BaseHTTPRequestHandler):
+    snapshot = None
+    quiet = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = url.path.strip("/") or "index"
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        try:
+            body = self.lookup(self.snapshot.current(), endpoint, params)
+        except LookupError as e:
+            return self.error(HTTPStatus.NOT_FOUND, str(e))
+        except ValueError as e:
+            return self.error(HTTPStatus.BAD_REQUEST, str(e))
+
+        compressed = body.gzip is not None and accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        payload, etag = (body.gzip, body.gzip_etag) if compressed else (body.json, body.etag)
+
+        if matches(self.headers.get("If-None-Match", ""), etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def lookup(self, snapshot, endpoint, params):
+        if endpoint == "index":
+            return Body(pd.DataFrame({"Endpoint": ["seasons", "career", "leaders"] + list(TABLES)}))
+        if endpoint in ("seasons", "career"):
+            return snapshot.bodies[(endpoint, None, None)]
+
+        if not snapshot.seasons:
+            raise LookupError("nothing has been published yet")
+        season = int(params.get("season", snapshot.seasons[-1]))
+        if season not in snapshot.seasons:
+            raise LookupError(f"no season {season}")
+
+        if endpoint == "leaders":
+            stat = params.get("stat", "PTS").upper()
+            if stat not in LEADERS:
+                raise ValueError(f"stat must be one of {', '.join(LEADERS)}")
+            gp = int(params.get("min_gp", 1))
+            # Like the Home page, a minimum nobody meets is an empty board.
+            return snapshot.bodies.get(("leaders", season, (stat, gp))) or EMPTY
+
+        team = params.get("team")
+        if team is not None:
+            if endpoint not in BY_TEAM:
+                raise ValueError(f"{endpoint} doesn't take a team")
+            return snapshot.bodies.get((endpoint, season, team)) or EMPTY
+
+        if endpoint not in TABLES:
+            raise LookupError(f"no endpoint {endpoint!r}")
+        return snapshot.bodies.get((endpoint, season, None)) or EMPTY
+
+    def error(self, status, message):
+        payload = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+EMPTY = Body(pd.DataFrame())
+
+
+def serve(host="127.0.0.1", port=8502, db=None, quiet=True):
+    handler = type("Handler", (Handler,), {"snapshot": Snapshot(db or DB), "quiet": quiet})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--db", type=pathlib.Path, default=DB, help="published database to serve")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, db=args.db, quiet=not args.verbose)
+    print(f"Serving {args.db} on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,293 @@
+import csv
+import json
+import time
+import argparse
+import pathlib
+import datetime
+import platform
+import subprocess
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+import compute
+
+QUARTERS = ["1st", "2nd", "3rd", "4th"]
+
+# League shapes as teams x seasons x games (per team, per season).
+SIZES = ["12x1x10", "24x3x15", "50x10x20"]
+
+
+def team_names(teams):
+    # The replay team always exists so `games.json` has something to describe.
+    names = [compute.REPLAYS] + [f"Team {i:02d}" for i in range(1, teams)]
+    return names[:teams]
+
+
+def rosters(names, roster):
+    return {team: [f"{team} P{i}" for i in range(1, roster + 1)] for team in names}
+
+
+def player_line(rng, player):
+    fga = int(rng.integers(2, 22))
+    fgm = int(rng.binomial(fga, 0.47))
+    tpa = int(rng.integers(0, fga + 1))
+    tpm = min(int(rng.binomial(tpa, 0.35)), fgm)
+    ftm = int(rng.integers(0, 5))
+    return {
+        "Player": player,
+        "PTS": 2 * fgm + tpm + ftm,
+        "REB": int(rng.integers(0, 12)),
+        "AST": int(rng.integers(0, 11)),
+        "STL": int(rng.integers(0, 5)),
+        "BLK": int(rng.integers(0, 4)),
+        "FLS": int(rng.integers(0, 5)),
+        "TO": int(rng.integers(0, 6)),
+        "FGM": fgm,
+        "FGA": fga,
+        "3PM": tpm,
+        "3PA": tpa,
+    }
+
+
+def quarter_line(rng, team, total):
+    split = rng.multinomial(total, [0.25] * 4)
+    return {"Team": team, **dict(zip(QUARTERS, map(int, split))), "Total": total}
+
+
+def write_csv(df, filename):
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(filename, index=False, quoting=csv.QUOTE_ALL)
+
+
+def generate(root, teams=12, seasons=1, games=10, roster=5, seed=0):
+    # Writes a league in the same layout as `csv/`: per-season teams,
+    # per-team boxscores, per-game quarter lines and dates, and the replay
+    # catalog.
+    root = pathlib.Path(root)
+    rng = np.random.default_rng(seed)
+
+    names = team_names(teams)
+    players = rosters(names, roster)
+    groups = [chr(ord("A") + i) for i in range(max(1, teams // 3))]
+
+    for season in range(1, seasons + 1):
+        sdir = root / f"s{season}"
+        write_csv(
+            pd.DataFrame({"Team": names, "Group": [groups[i % len(groups)] for i in range(teams)]}),
+            sdir / "teams.csv",
+        )
+
+        played = dict.fromkeys(names, 0)
+        matchups = {}
+        replays = {}
+        dates = []
+        for day in range(games):
+            date = (datetime.date(2022, 1, 1) + datetime.timedelta(days=365 * season + day)).isoformat()
+            order = [str(team) for team in rng.permutation(names)]
+            for away, home in zip(order[0::2], order[1::2]):
+                lines = {}
+                for team, opponent in ((away, home), (home, away)):
+                    played[team] += 1
+                    box = pd.DataFrame([player_line(rng, p) for p in players[team]])
+                    write_csv(box, sdir / "boxscores" / team / f"g{played[team]}-{opponent}.csv")
+                    lines[team] = quarter_line(rng, team, int(box["PTS"].sum()))
+
+                matchups[(away, home)] = matchups.get((away, home), 0) + 1
+                suffix = f"-{matchups[(away, home)]}" if matchups[(away, home)] > 1 else ""
+                write_csv(
+                    pd.DataFrame([lines[away], lines[home]]),
+                    sdir / "games" / f"{away}-{home}{suffix}.csv",
+                )
+                dates.append({"Game": f"{away}-{home}{suffix}", "Date": date})
+
+                if compute.REPLAYS in lines:
+                    opponent = home if away == compute.REPLAYS else away
+                    replays[str(played[compute.REPLAYS])] = {
+                        "title": f"{compute.REPLAYS} vs. {opponent}",
+                        "stream": "",
+                        "breakdown": [
+                            {"Quarter": q, "Team": team, "PTS": lines[team][q]}
+                            for team in (compute.REPLAYS, opponent)
+                            for q in QUARTERS
+                        ],
+                    }
+
+        write_csv(pd.DataFrame(dates, columns=compute.DATES), sdir / "dates.csv")
+        with open(sdir / "games.json", "w") as f:
+            json.dump({str(season): replays}, f, indent=2)
+
+    return root
+
+
+def timed(results, stage, func, repeat=1):
+    best, out = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    rows = len(out) if hasattr(out, "__len__") else None
+    results.append({"Stage": stage, "Seconds": best, "Rows": rows})
+    return out
+
+
+def stages(results, label, runs):
+    # Each stage `compute.update` recorded (see `compute.stage`), best of
+    # `runs`, where every run is a list of stage rows.
+    df = pd.DataFrame([s for run in runs for s in run], columns=compute.STAGE_COLUMNS)
+    df = df.groupby("Stage", sort=False).agg(Seconds=("Seconds", "min"), Rows=("RowsOut", "last"))
+    for stage, row in df.iterrows():
+        rows = None if pd.isna(row["Rows"]) else int(row["Rows"])
+        results.append({"Stage": f"{label}:{stage}", "Seconds": row["Seconds"], "Rows": rows})
+
+
+def pipeline(results, engine, season, repeat=1):
+    # The stages behind every published table, as a full update of one
+    # season (compacting its store first, like `compute.py`) runs them.
+    runs = []
+    for _ in range(repeat):
+        with compute.collect() as run:
+            with compute.stage("compact"):
+                compute.compact(season)
+            compute.update(engine, season=season, full=True)
+        runs.append(run)
+    stages(results, "update[full]", runs)
+
+
+def publish(results, engine, season):
+    timed(results, "update[full]", lambda: compute.update(engine, season=season, full=True))
+    timed(results, "update[noop]", lambda: compute.update(engine, season=season))
+
+    # Rewrite one boxscore so the incremental path has a file to fold.
+    filename = next((compute.DATA / f"s{season}" / "boxscores").glob("*/*.csv"))
+    filename.write_bytes(filename.read_bytes() + b"\n")
+    with compute.collect() as run:
+        timed(results, "update[one file]", lambda: compute.update(engine, season=season))
+    stages(results, "update[one file]", [run])
+
+
+def pages(results, db, season, repeat=1):
+    # The page data loaders, cold (empty cache) and warm.
+    import Home
+    from pages import Blood_Tigers as Tigers
+
+    Home.DB = db
+    loaders = {
+        "Home.get_standings": lambda: Home.get_standings(season),
+        "Home.get_team_summary": lambda: Home.get_team_summary(season),
+        "Home.get_opp_summary": lambda: Home.get_opp_summary(season),
+        "Home.get_diff_summary": lambda: Home.get_diff_summary(season),
+        "Home.get_team_advanced": lambda: Home.get_team_advanced(season),
+        "Home.get_ratings": lambda: Home.get_ratings(season),
+        "Home.get_odds": lambda: Home.get_odds(season),
+        "Home.get_highs": lambda: Home.get_highs(season),
+        "Home.get_groups": lambda: Home.get_groups(season),
+        "Home.get_leaders": lambda: [Home.get_leaders(stat, 4, season) for stat in compute.LEADERS],
+        "Home.get_games": lambda: Home.get_games(season),
+        "Home.get_schedule": lambda: Home.get_schedule(Tigers.TEAM, season),
+        "Tigers.summary": lambda: Tigers.summary(Tigers.TEAM, season),
+        "Tigers.records": lambda: Tigers.records(Tigers.TEAM, season),
+        "Tigers.advanced": lambda: Tigers.advanced(Tigers.TEAM, season),
+        "Tigers.games": lambda: Tigers.games(Tigers.TEAM, season),
+        "Tigers.boxscores": lambda: Tigers.boxscores(Tigers.TEAM, season),
+    }
+    for name, func in loaders.items():
+        Home.cache_data.clear()
+        timed(results, f"{name}[cold]", func)
+        timed(results, f"{name}[warm]", func, repeat)
+
+    # Everything the JSON API serves, rebuilt once per publish.
+    import api
+
+    timed(results, "api.build", lambda: api.build(db)[1], repeat)
+
+
+def commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(size, root, roster=5, repeat=3, seed=0):
+    teams, seasons, games = (int(n) for n in size.split("x"))
+
+    root = pathlib.Path(root) / size
+    generate(root / "csv", teams=teams, seasons=seasons, games=games, roster=roster, seed=seed)
+    compute.DATA = root / "csv"
+    compute.BUILD = root / "build"
+
+    db = root / "bench.sqlite3"
+    db.unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{db}")
+
+    for season in compute.seasons():
+        compute.update(engine, season=season, full=True)
+
+    # Per-season stages are timed on the latest season, on top of the rest.
+    results = []
+    pipeline(results, engine, seasons, repeat)
+    pages(results, db, seasons, repeat)
+    publish(results, engine, seasons)
+
+    made = {
+        "Commit": commit(),
+        "When": datetime.datetime.now().isoformat(timespec="seconds"),
+        "Python": platform.python_version(),
+        "Size": size,
+        "Teams": teams,
+        "Seasons": seasons,
+        "Games": games,
+        "Roster": roster,
+    }
+    return [{**made, **r} for r in results]
+
+
+def compare(output):
+    # Best time per stage and size for the two most recent commits on file.
+    df = pd.read_json(output, lines=True)
+    recent = list(dict.fromkeys(reversed(df["Commit"].tolist())))[:2][::-1]
+    df = df[df["Commit"].isin(recent)]
+
+    df = df.pivot_table(index=["Size", "Stage"], columns="Commit", values="Seconds", aggfunc="min")
+    df = df[recent]
+    if len(recent) == 2:
+        df["Ratio"] = df[recent[1]] / df[recent[0]]
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--size",
+        action="append",
+        help="league shape as TEAMSxSEASONSxGAMES (may be repeated)",
+    )
+    parser.add_argument("--roster", type=int, default=5, help="players per team")
+    parser.add_argument("--repeat", type=int, default=3, help="keep the best of this many runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--root", default="build/bench", help="where generated leagues are written")
+    parser.add_argument("--output", default="build/bench.jsonl", help="results are appended here")
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="only print the last two commits' results side by side",
+    )
+    args = parser.parse_args()
+
+    output = pathlib.Path(args.output)
+    if not args.compare:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        for size in args.size or SIZES:
+            made = run(size, args.root, roster=args.roster, repeat=args.repeat, seed=args.seed)
+            with open(output, "a") as f:
+                for r in made:
+                    f.write(json.dumps(r) + "\n")
+            print(f"{size}: {len(made)} timings written to {output}")
+
+    with pd.option_context("display.max_rows", None, "display.width", 120):
+        print(compare(output).to_string(float_format="{:.4f}".format))
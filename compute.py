@@ -1,477 +1,1890 @@
+import os
+import re
+import csv
+import json
+import math
+import time
+import hashlib
+import argparse
 import pathlib
 import datetime
+import heapq
+import functools
+import contextlib
+import threading
+import tracemalloc
 
+import numpy as np
 import pandas
 import pandas as pd
 import streamlit as st
 
 from collections import defaultdict
-from sqlalchemy import create_engine
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy import bindparam, create_engine, inspect, text
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the compact boxscore store is optional
+    pa = pq = None
 
 DATA = pathlib.Path("csv")
+BUILD = pathlib.Path("build")
 
+# Ingestion pool: one worker reads serially; processes suit parse-heavy
+# cold rebuilds of many seasons, threads are cheaper to start.
+WORKERS = 1
+EXECUTOR = "thread"
 
-def players(season=1):
-    teams = pd.read_csv(DATA / "s1" / "teams.csv")
 
-    made = []
-    for _, entry in teams.iterrows():
-        team = entry["Team"]
-
-        players = []
-        games = []
-        for filename in (DATA / f"s{season}" / "boxscores" / f"{team}").glob("*.csv"):
-            gdf = pd.read_csv(filename)
-            games.append(gdf)
-            players.extend(gdf["Player"])
-
-        totals = pd.concat(games, axis=0, ignore_index=True)
-        for player in set(players):
-            games_played = players.count(player)
-
-            fgm = float(totals.loc[totals["Player"] == player, "FGM"].sum())
-            fga = float(totals.loc[totals["Player"] == player, "FGA"].sum())
-
-            tpm = float(totals.loc[totals["Player"] == player, "3PM"].sum())
-            tpa = float(totals.loc[totals["Player"] == player, "3PA"].sum())
-
-            made.append(
-                {
-                    "Player": player,
-                    "Team": team,
-                    "GP": games_played,
-                    "FGM": fgm,
-                    "FGA": fga,
-                    "FG%": fgm / fga if fga else 0,
-                    "3PM": tpm,
-                    "3PA": tpa,
-                    "3P%": tpm / tpa if tpa else 0,
-                    "TRB": totals.loc[totals["Player"] == player, "REB"].sum()
-                    / games_played,
-                    "AST": totals.loc[totals["Player"] == player, "AST"].sum()
-                    / games_played,
-                    "STL": totals.loc[totals["Player"] == player, "STL"].sum()
-                    / games_played,
-                    "BLK": totals.loc[totals["Player"] == player, "BLK"].sum()
-                    / games_played,
-                    "TOV": totals.loc[totals["Player"] == player, "TO"].sum()
-                    / games_played,
-                    "PTS": totals.loc[totals["Player"] == player, "PTS"].sum()
-                    / games_played,
-                },
-            )
+def read_all(reader, paths, workers=None):
+    # Results come back in `paths` order, so tables match the serial path.
+    paths = list(paths)
+    workers = WORKERS if workers is None else workers
+    if workers <= 1 or len(paths) <= 1:
+        return [reader(filename) for filename in paths]
 
-    return pd.DataFrame.from_records(
-        made,
-        columns=[
-            "Player",
-            "Team",
-            "GP",
-            "FGM",
-            "FGA",
-            "FG%",
-            "3PM",
-            "3PA",
-            "3P%",
-            "TRB",
-            "AST",
-            "STL",
-            "BLK",
-            "TOV",
-            "PTS",
-        ],
-    )
+    pool = ProcessPoolExecutor if EXECUTOR == "process" else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        chunksize = max(1, len(paths) // (workers * 4))
+        return list(executor.map(reader, paths, chunksize=chunksize))
 
 
-def recent_games():
-    games = DATA / "s1" / "games"
+# Metrics of the stages run while `collect()` is open on a thread, appended
+# by `stage()`; stages run outside of one aren't kept. Peak memory is only
+# measured while tracemalloc is tracing (see `--trace-memory`).
+RUN = threading.local()
+STAGE_COLUMNS = ["Stage", "RowsIn", "RowsOut", "Files", "Seconds", "PeakMB"]
+RUNS = BUILD / "runs.jsonl"
 
-    made = []
-    for game in games.glob("*.csv"):
-        away, home = [g.split(".csv")[0] for g in game.name.split("-")[:2]]
 
-        df = pandas.read_csv(game)
-        m_timestamp = game.stat().st_mtime
-        m_time = datetime.datetime.fromtimestamp(m_timestamp)
-        m_day = m_time.strftime("%m/%d/%Y")
+@contextlib.contextmanager
+def collect():
+    # A fresh list of stage metrics for one run; a run inside another one
+    # hands its stages on to it when done.
+    outer = getattr(RUN, "stages", None)
+    RUN.stages = made = []
+    try:
+        yield made
+    finally:
+        RUN.stages = outer
+        if outer is not None:
+            outer.extend(made)
+
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    made = dict.fromkeys(STAGE_COLUMNS)
+    made.update({"Stage": name, "RowsIn": rows_in})
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    try:
+        yield made
+    finally:
+        made["Seconds"] = time.perf_counter() - start
+        if tracing:
+            made["PeakMB"] = tracemalloc.get_traced_memory()[1] / 2**20
+        if getattr(RUN, "stages", None) is not None:
+            RUN.stages.append(made)
+
+
+def record_run(stages, started, args=None, path=None, **extra):
+    path = pathlib.Path(path or RUNS)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    run = {
+        "Started": started.isoformat(timespec="seconds"),
+        "Seconds": (datetime.datetime.now() - started).total_seconds(),
+        "Args": args or {},
+        **extra,
+        "Stages": stages,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    return run
+
+
+def read_runs(path=None):
+    path = pathlib.Path(path or RUNS)
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def seasons():
+    found = [p.name[1:] for p in DATA.glob("s*") if p.is_dir()]
+    return sorted(int(s) for s in found if s.isdigit())
+
+
+def load_teams(season=1):
+    return pd.read_csv(DATA / f"s{season}" / "teams.csv")
+
+
+# Boxscores are stored as `boxscores/<Team>/g<N>-<Opponent>.csv`.
+BOXSCORE_NAME = re.compile(r"^g(\d+)-(.+)$")
+
+
+def parse_boxscore_name(path):
+    match = BOXSCORE_NAME.match(path.stem)
+    if not match:
+        raise ValueError(f"unexpected boxscore filename: {path.name}")
+    return int(match.group(1)), match.group(2)
+
 
+# Gamertags OCR misread, mapped to the player's canonical tag. The table is
+# shared by every season and applied as boxscores are read, so the CSVs keep
+# what was scraped. Only "auto" and "confirmed" rows are applied: "review"
+# rows are ambiguous matches waiting on someone to confirm them (or mark
+# them "distinct"; see names.py).
+ALIASES = ["Alias", "Player", "Status"]
+APPLIED = ["auto", "confirmed"]
+
+
+def aliases_path():
+    return DATA / "aliases.csv"
+
+
+def read_aliases():
+    filename = aliases_path()
+    if not filename.exists():
+        return pd.DataFrame(columns=ALIASES)
+    return pd.read_csv(filename, dtype=str, keep_default_na=False)
+
+
+def canonical_names():
+    df = read_aliases()
+    df = df[df["Status"].isin(APPLIED)]
+    return dict(zip(df["Alias"], df["Player"]))
+
+
+def read_boxscore(filename, season=1, names=None):
+    game, opponent = parse_boxscore_name(filename)
+
+    gdf = pd.read_csv(filename)
+    gdf.insert(0, "Season", season)
+    gdf.insert(1, "Team", filename.parent.name)
+    gdf.insert(2, "Game", game)
+    gdf.insert(3, "Opponent", opponent)
+    gdf["Path"] = relpath(filename)
+    if names:
+        gdf["Player"] = gdf["Player"].replace(names)
+
+    return gdf
+
+
+def boxscore_index(season=1, team=None):
+    pattern = f"{team}/*.csv" if team else "*/*.csv"
+
+    made = []
+    for filename in sorted((DATA / f"s{season}" / "boxscores").glob(pattern)):
+        game, opponent = parse_boxscore_name(filename)
         made.append({
-            "Home": home,
-            "Away": away,
-            "HScore": df.iloc[1, 5],
-            "AScore": df.iloc[0, 5],
-            "Date": m_day
+            "Season": season,
+            "Team": filename.parent.name,
+            "Game": game,
+            "Opponent": opponent,
+            "Path": filename,
         })
 
-    df = pd.DataFrame.from_records(
+    return pd.DataFrame.from_records(
         made,
-        columns=[
-            "Home",
-            "Away",
-            "HScore",
-            "AScore",
-            "Date"
-        ],
+        columns=["Season", "Team", "Game", "Opponent", "Path"],
+    )
+
+
+# Column types of the compact per-season boxscore store.
+STORE_DTYPES = {
+    "Season": "int16",
+    "Team": "category",
+    "Game": "int16",
+    "Opponent": "category",
+    "Player": "category",
+    "PTS": "int16",
+    "REB": "int16",
+    "AST": "int16",
+    "STL": "int16",
+    "BLK": "int16",
+    "FLS": "int16",
+    "TO": "int16",
+    "FGM": "int16",
+    "FGA": "int16",
+    "3PM": "int16",
+    "3PA": "int16",
+    "Path": "category",
+}
+
+
+def store_path(season=1):
+    return BUILD / f"s{season}" / "boxscores.parquet"
+
+
+def fingerprint(season=1):
+    # Identifies the current set of boxscore CSVs (and the aliases applied to
+    # them) from their metadata alone.
+    digest = hashlib.sha1()
+    shared = [aliases_path()] if aliases_path().exists() else []
+    for filename in list(boxscore_index(season)["Path"]) + shared:
+        stat = filename.stat()
+        digest.update(f"{relpath(filename)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def store_is_fresh(season=1, digest=None):
+    path = store_path(season)
+    if pq is None or not path.exists():
+        return False
+
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(b"fingerprint") == (digest or fingerprint(season)).encode()
+
+
+def compact(season=1):
+    if pq is None:
+        return None
+
+    path = store_path(season)
+    digest = fingerprint(season)
+    if store_is_fresh(season, digest):
+        return path
+
+    box = load_boxscores(season, store=False).astype(STORE_DTYPES)
+
+    table = pa.Table.from_pandas(box, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"fingerprint": digest.encode()}
     )
 
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_suffix(".tmp")
+    pq.write_table(table, staging)
+    os.replace(staging, path)
+
+    return path
+
+
+def load_boxscores(season=1, team=None, paths=None, columns=None, store=True, workers=None):
+    # Whole-season reads come from the compact store when it's up to date
+    # with the CSVs; the CSV tree stays the source of truth.
+    if paths is None and store and store_is_fresh(season):
+        return pd.read_parquet(
+            store_path(season),
+            columns=columns,
+            filters=[("Team", "==", team)] if team else None,
+            memory_map=True,
+        )
+
+    if paths is None:
+        paths = list(boxscore_index(season, team)["Path"])
+
+    reader = functools.partial(read_boxscore, season=season, names=canonical_names())
+    frames = read_all(reader, paths, workers)
+    if frames:
+        df = pd.concat(frames, axis=0, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=BOX_KEYS + BOX_STATS + ["Path"])
+    return df[columns] if columns else df
+
+
+# Counting stats summed per player (or team) before deriving any rates.
+BOX_KEYS = ["Season", "Team", "Game", "Opponent", "Player"]
+BOX_STATS = ["PTS", "REB", "AST", "STL", "BLK", "FLS", "TO", "FGM", "FGA", "3PM", "3PA"]
+# A boxscore CSV is a player's tag followed by their line.
+BOXSCORE_FILE = ["Player"] + BOX_STATS
+COUNTING = ["FGM", "FGA", "3PM", "3PA", "REB", "AST", "STL", "BLK", "TO", "PTS"]
+
+
+def decode(df):
+    # Aggregates carry plain labels, whichever store the boxscores came from.
+    for column in df.select_dtypes("category").columns:
+        df[column] = df[column].astype(str)
     return df
 
 
-def leaders(stat, show, stats_df):
-    df = stats_df.sort_values(stat, ascending=False)
-    # df = df[(df["GP"] >= min)]
-    # df = df.head(10)
-    df = df.reset_index(drop=True)
+def player_sums(box, by=("Player",)):
+    grouped = box.groupby(list(by), sort=False, observed=True)
 
-    return df[show]
+    sums = grouped[COUNTING].sum()
+    sums.insert(0, "GP", grouped.size())
 
+    return decode(sums.reset_index())
 
-def totals(season=1):
-    teams = pd.read_csv(DATA / "s1" / "teams.csv")
 
-    made = []
-    for _, entry in teams.iterrows():
-        p = DATA / f"s{season}" / "boxscores" / entry["Team"]
-
-        games = []
-        for filename in p.glob("*.csv"):
-            gdf = pd.read_csv(filename)
-            games.append(gdf)
-
-        totals = pd.concat(games, axis=0, ignore_index=True)
-
-        games_played = len(games)
-
-        fgm = float(totals["FGM"].sum())
-        fga = float(totals["FGA"].sum())
-
-        tpm = float(totals["3PM"].sum())
-        tpa = float(totals["3PA"].sum())
-
-        made.append(
-            {
-                "Team": entry["Team"],
-                "GP": games_played,
-                "FGM": fgm / games_played,
-                "FGA": fga / games_played,
-                "FG%": fgm / fga if fga else 0,
-                "3PM": tpm / games_played,
-                "3PA": tpa / games_played,
-                "3P%": tpm / tpa if tpa else 0,
-                "TRB": totals["REB"].sum() / games_played,
-                "AST": totals["AST"].sum() / games_played,
-                "STL": totals["STL"].sum() / games_played,
-                "BLK": totals["BLK"].sum() / games_played,
-                "TOV": totals["TO"].sum() / games_played,
-                "PTS": totals["PTS"].sum() / games_played,
-            },
-        )
+def player_rates(sums, by=("Player",)):
+    gp = sums["GP"]
 
-    df = pd.DataFrame.from_records(
-        made,
-        columns=[
-            "Team",
-            "GP",
-            "FGM",
-            "FGA",
-            "FG%",
-            "3PM",
-            "3PA",
-            "3P%",
-            "TRB",
-            "AST",
-            "STL",
-            "BLK",
-            "TOV",
-            "PTS",
-        ],
-    )
+    fgm = sums["FGM"].astype(float)
+    fga = sums["FGA"].astype(float)
 
-    df = df.sort_values(by=["PTS"], ascending=False)
-    df = df.reset_index(drop=True)
+    tpm = sums["3PM"].astype(float)
+    tpa = sums["3PA"].astype(float)
+
+    df = sums[list(by)].copy()
+    df["GP"] = gp
+    df["FGM"] = fgm
+    df["FGA"] = fga
+    df["FG%"] = (fgm / fga).where(fga > 0, 0.0)
+    df["3PM"] = tpm
+    df["3PA"] = tpa
+    df["3PG"] = tpm / gp
+    df["3P%"] = (tpm / tpa).where(tpa > 0, 0.0)
+    df["TRB"] = sums["REB"] / gp
+    df["AST"] = sums["AST"] / gp
+    df["STL"] = sums["STL"] / gp
+    df["BLK"] = sums["BLK"] / gp
+    df["TOV"] = sums["TO"] / gp
+    df["PTS"] = sums["PTS"] / gp
 
     return df
 
 
-def op_totals(season=1):
-    teams = pd.read_csv(DATA / "s1" / "teams.csv")
+QUARTERS = ["1st", "2nd", "3rd", "4th"]
+# A game CSV is the away then the home team's quarter line.
+GAME_FILE = ["Team"] + QUARTERS + ["Total"]
 
-    made = []
-    for _, entry in teams.iterrows():
-        p = DATA / f"s{season}" / "boxscores"
+GAME_COLUMNS = (
+    ["Season", "Away", "Home"]
+    + [f"A{q}" for q in QUARTERS]
+    + [f"H{q}" for q in QUARTERS]
+    + ["AScore", "HScore", "Winner", "Margin", "Date"]
+)
 
-        games = []
-        for team in p.iterdir():
-            if team.name == entry["Team"]:
-                continue
 
-            for filename in team.glob("*.csv"):
-                if entry["Team"] not in filename.name:
-                    continue
-                gdf = pd.read_csv(filename)
-                games.append(gdf)
-
-        totals = pd.concat(games, axis=0, ignore_index=True)
-
-        games_played = len(games)
-
-        fgm = float(totals["FGM"].sum())
-        fga = float(totals["FGA"].sum())
-
-        tpm = float(totals["3PM"].sum())
-        tpa = float(totals["3PA"].sum())
-
-        made.append(
-            {
-                "Team": entry["Team"],
-                "GP": games_played,
-                "FGM": fgm / games_played,
-                "FGA": fga / games_played,
-                "FG%": fgm / fga if fga else 0,
-                "3PM": tpm / games_played,
-                "3PA": tpa / games_played,
-                "3P%": tpm / tpa if tpa else 0,
-                "TRB": totals["REB"].sum() / games_played,
-                "AST": totals["AST"].sum() / games_played,
-                "STL": totals["STL"].sum() / games_played,
-                "BLK": totals["BLK"].sum() / games_played,
-                "TOV": totals["TO"].sum() / games_played,
-                "PTS": totals["PTS"].sum() / games_played,
-            },
-        )
+# When each game was played, one row per game file in the order the games
+# were played. A game is dated the first time it's seen and never again, so
+# copies and checkouts (which reset file mtimes) can't rewrite the history.
+DATES = ["Game", "Date"]
+
+
+def dates_path(season=1):
+    return DATA / f"s{season}" / "dates.csv"
+
+
+def landed(filename):
+    return datetime.date.fromtimestamp(filename.stat().st_mtime).isoformat()
+
+
+def read_dates(season=1):
+    filename = dates_path(season)
+    if not filename.exists():
+        return pd.DataFrame({"Game": [], "Date": [], "Order": []})
+
+    df = pd.read_csv(filename, dtype=str)
+    df["Order"] = range(1, len(df) + 1)
+    return df
+
+
+def record_dates(season=1):
+    # Appends every undated game, in the order the files landed.
+    known = set(read_dates(season)["Game"])
+    paths = sorted(
+        (p for p in (DATA / f"s{season}" / "games").glob("*.csv") if p.stem not in known),
+        key=lambda p: (p.stat().st_mtime_ns, p.name),
+    )
+    if not paths:
+        return 0
+
+    filename = dates_path(season)
+    df = pd.DataFrame({"Game": [p.stem for p in paths], "Date": [landed(p) for p in paths]})
+    df.to_csv(filename, mode="a", header=not filename.exists(), index=False, quoting=csv.QUOTE_ALL)
+    return len(df)
+
+
+def read_game(game, season=1):
+    # Games are stored as `games/<Away>-<Home>[-<N>].csv`, with the away
+    # team's line first.
+    away, home = [g.split(".csv")[0] for g in game.name.split("-")[:2]]
+
+    df = pandas.read_csv(game)
+
+    a_line, h_line = df.iloc[0], df.iloc[1]
+
+    made = {"Season": season, "Away": away, "Home": home}
+    for q in QUARTERS:
+        made[f"A{q}"] = int(a_line[q])
+        made[f"H{q}"] = int(h_line[q])
+    made["AScore"] = int(a_line["Total"])
+    made["HScore"] = int(h_line["Total"])
+    made["Date"] = landed(game)
+
+    return made
+
+
+def load_games(season=1, paths=None, workers=None):
+    if paths is None:
+        paths = sorted((DATA / f"s{season}" / "games").glob("*.csv"))
 
     df = pd.DataFrame.from_records(
-        made,
-        columns=[
-            "Team",
-            "GP",
-            "FGM",
-            "FGA",
-            "FG%",
-            "3PM",
-            "3PA",
-            "3P%",
-            "TRB",
-            "AST",
-            "STL",
-            "BLK",
-            "TOV",
-            "PTS",
-        ],
+        read_all(functools.partial(read_game, season=season), paths, workers),
+        columns=GAME_COLUMNS,
     )
 
-    df = df.sort_values(by=["PTS"], ascending=True)
-    df = df.reset_index(drop=True)
+    df["Winner"] = ""
+    df.loc[df["HScore"] > df["AScore"], "Winner"] = df["Home"]
+    df.loc[df["AScore"] > df["HScore"], "Winner"] = df["Away"]
+    df["Margin"] = (df["HScore"] - df["AScore"]).abs()
+
+    # Recorded dates win over the landing day of games not yet on file.
+    dates = read_dates(season).set_index("Game")["Date"]
+    df["Date"] = [dates.get(p.stem, d) for p, d in zip(paths, df["Date"])]
+    df["Path"] = [relpath(p) for p in paths]
 
     return df
 
 
-def summary(season=1):
-    players = []
-    games = []
+GAME_LOG = ["Order", "Date", "Away", "Home", "AScore", "HScore", "Winner", "Margin"]
 
-    made = []
-    for filename in (DATA / f"s{season}" / "boxscores").glob("**/*.csv"):
-        gdf = pd.read_csv(filename)
-        games.append(gdf)
-        players.extend(gdf["Player"])
 
-    totals = pd.concat(games, axis=0, ignore_index=True)
-    for player in set(players):
-        games_played = players.count(player)
+def recent_games(season=1, games=None, dates=None):
+    # The season's game log, numbered in the order the games were played.
+    if games is None:
+        games = load_games(season)
+    if dates is None:
+        dates = read_dates(season)
+
+    on_file = dates.set_index("Game")
+    stems = games["Path"].map(lambda p: pathlib.PurePosixPath(p).stem)
+    df = games.assign(
+        Date=stems.map(on_file["Date"]).fillna(games["Date"]),
+        Order=stems.map(on_file["Order"]),
+    )
+    df = df.sort_values(["Date", "Order", "Path"], na_position="last")
+    df["Order"] = range(1, len(df) + 1)
+    return df[GAME_LOG].reset_index(drop=True)
+
+
+def schedule(log):
+    # The game log from each team's side: one row per team per game.
+    sides = []
+    for team, opponent, site, pts, opp in [
+        ("Away", "Home", "Away", "AScore", "HScore"),
+        ("Home", "Away", "Home", "HScore", "AScore"),
+    ]:
+        sides.append(pd.DataFrame({
+            "Team": log[team],
+            "Order": log["Order"],
+            "Date": log["Date"],
+            "Opponent": log[opponent],
+            "Site": site,
+            "PTS": log[pts],
+            "OPP": log[opp],
+            "Result": "T",
+        }))
+
+    df = pd.concat(sides, ignore_index=True)
+    df.loc[df["PTS"] > df["OPP"], "Result"] = "W"
+    df.loc[df["PTS"] < df["OPP"], "Result"] = "L"
+    return df.sort_values(["Team", "Order"]).reset_index(drop=True)
+
+
+# Leaderboards published for Home.py: stat key -> (ranked column, the made
+# column shown beside percentage stats).
+LEADERS = {
+    "PTS": ("PTS", None),
+    "AST": ("AST", None),
+    "TPG": ("3PG", None),
+    "TPP": ("3P%", "3PM"),
+    "REB": ("TRB", None),
+    "BLK": ("BLK", None),
+    "STL": ("STL", None),
+    "FGP": ("FG%", "FGM"),
+}
+
+TOP_N = 10
+
+
+def leaderboard(stats_df, n=TOP_N):
+    # Ties rank by name rather than by however the rows happened to arrive.
+    stats_df = stats_df.sort_values("Player", kind="stable").reset_index(drop=True)
+    gp = stats_df["GP"].to_numpy()
+
+    # Each stat is ranked once; a minimum-GP board is the first `n` of that
+    # ranking who qualify.
+    made = defaultdict(list)
+    for key, (stat, extra) in LEADERS.items():
+        ranked = stats_df.sort_values(stat, ascending=False, kind="stable").index.to_numpy()
+        values = stats_df[stat].to_numpy(dtype=float)
+        shown = stats_df[extra].to_numpy(dtype=float) if extra else np.full(len(stats_df), np.nan)
+        for min_gp in range(1, int(gp.max(initial=0)) + 1):
+            top = ranked[gp[ranked] >= min_gp][:n]
+            made["Stat"].append(np.full(len(top), key, dtype=object))
+            made["MinGP"].append(np.full(len(top), min_gp))
+            made["Rank"].append(np.arange(1, len(top) + 1))
+            made["Player"].append(stats_df["Player"].to_numpy()[top])
+            made["GP"].append(gp[top])
+            made["Value"].append(values[top])
+            made["Made"].append(shown[top])
+
+    columns = ["Stat", "MinGP", "Rank", "Player", "GP", "Value", "Made"]
+    return pd.DataFrame({column: np.concatenate(parts) for column, parts in made.items()}, columns=columns)
+
+
+def team_sums(box, by=("Team",)):
+    grouped = box.groupby(list(by), sort=False, observed=True)
+
+    sums = grouped[COUNTING].sum()
+    games = box.drop_duplicates(["Season", "Team", "Game"])
+    sums.insert(0, "GP", games.groupby(list(by), sort=False, observed=True).size())
+
+    return decode(sums.reset_index())
+
+
+def team_rates(sums, by=("Team",)):
+    gp = sums["GP"]
+
+    fgm = sums["FGM"].astype(float)
+    fga = sums["FGA"].astype(float)
+
+    tpm = sums["3PM"].astype(float)
+    tpa = sums["3PA"].astype(float)
+
+    df = sums[list(by)].copy()
+    df["GP"] = gp
+    df["FGM"] = fgm / gp
+    df["FGA"] = fga / gp
+    df["FG%"] = (fgm / fga).where(fga > 0, 0.0)
+    df["3PM"] = tpm / gp
+    df["3PA"] = tpa / gp
+    df["3P%"] = (tpm / tpa).where(tpa > 0, 0.0)
+    df["TRB"] = sums["REB"] / gp
+    df["AST"] = sums["AST"] / gp
+    df["STL"] = sums["STL"] / gp
+    df["BLK"] = sums["BLK"] / gp
+    df["TOV"] = sums["TO"] / gp
+    df["PTS"] = sums["PTS"] / gp
 
-        fgm = float(totals.loc[totals["Player"] == player, "FGM"].sum())
-        fga = float(totals.loc[totals["Player"] == player, "FGA"].sum())
+    return df
 
-        tpm = float(totals.loc[totals["Player"] == player, "3PM"].sum())
-        tpa = float(totals.loc[totals["Player"] == player, "3PA"].sum())
 
-        made.append(
-            {
-                "Player": player,
-                "GP": games_played,
-                "FGM": fgm,
-                "FGA": fga,
-                "FG%": fgm / fga if fga else 0,
-                "3PM": tpm,
-                "3PA": tpa,
-                "3PG": tpm / games_played,
-                "3P%": tpm / tpa if tpa else 0,
-                "TRB": totals.loc[totals["Player"] == player, "REB"].sum()
-                / games_played,
-                "AST": totals.loc[totals["Player"] == player, "AST"].sum()
-                / games_played,
-                "STL": totals.loc[totals["Player"] == player, "STL"].sum()
-                / games_played,
-                "BLK": totals.loc[totals["Player"] == player, "BLK"].sum()
-                / games_played,
-                "TOV": totals.loc[totals["Player"] == player, "TO"].sum()
-                / games_played,
-                "PTS": totals.loc[totals["Player"] == player, "PTS"].sum()
-                / games_played,
-            },
-        )
+def opponent_rows(box):
+    # Each boxscore is filed under the team whose players it lists, so the
+    # rows recorded *against* a team are the ones naming it as the opponent.
+    return box[box["Team"] != box["Opponent"]]
 
-    df = pd.DataFrame.from_records(
-        made,
-        columns=[
-            "Player",
-            "GP",
-            "FGM",
-            "FGA",
-            "FG%",
-            "3PM",
-            "3PA",
-            "3PG",
-            "3P%",
-            "TRB",
-            "AST",
-            "STL",
-            "BLK",
-            "TOV",
-            "PTS",
+
+# Advanced metrics. Boxscores carry no free-throw attempts, minutes or
+# offensive rebounds, so free throws made (the points not explained by field
+# goals) stand in for attempts, and rates are per 100 team possessions rather
+# than per 36 minutes.
+PER_100 = ["PTS", "REB", "AST", "STL", "BLK"]
+
+
+def possessions(sums):
+    ftm = (sums["PTS"] - 2 * sums["FGM"] - sums["3PM"]).clip(lower=0)
+    return sums["FGA"] + sums["TO"] + 0.44 * ftm
+
+
+def efg(sums):
+    fga = sums["FGA"]
+    return ((sums["FGM"] + 0.5 * sums["3PM"]) / fga).where(fga > 0, 0.0)
+
+
+def player_advanced(sums, team_poss, by=("Player",)):
+    # `team_poss` is the player's team's possessions over the same games, so
+    # the usage proxy is the share of them the player finished.
+    team_poss = pd.Series(team_poss, index=sums.index).astype(float)
+    stats = sums[COUNTING].astype(float)
+
+    df = sums[list(by)].copy()
+    df["GP"] = sums["GP"]
+    df["eFG%"] = efg(stats)
+    df["USG%"] = (100 * possessions(stats) / team_poss).where(team_poss > 0, 0.0)
+    df["AST/TO"] = (stats["AST"] / stats["TO"]).where(stats["TO"] > 0)
+    for stat in PER_100:
+        df[f"{stat}/100"] = (100 * stats[stat] / team_poss).where(team_poss > 0, 0.0)
+
+    return df
+
+
+def team_advanced(tsums, osums):
+    gp = tsums.set_index("Team")["GP"]
+    own = tsums.set_index("Team")[COUNTING].astype(float)
+    opp = osums.rename(columns={"Opponent": "Team"}).set_index("Team").reindex(own.index)
+    opp_gp = opp["GP"]
+    opp = opp[COUNTING].astype(float)
+
+    own_poss = possessions(own)
+    opp_poss = possessions(opp)
+
+    df = pd.DataFrame({"GP": gp}, index=own.index)
+    df["Pace"] = (own_poss / gp + opp_poss / opp_gp) / 2
+    df["ORtg"] = 100 * own["PTS"] / own_poss
+    df["DRtg"] = 100 * opp["PTS"] / opp_poss
+    df["Net"] = df["ORtg"] - df["DRtg"]
+    df["eFG%"] = efg(own)
+    df["OeFG%"] = efg(opp)
+    df["AST/TO"] = (own["AST"] / own["TO"]).where(own["TO"] > 0)
+
+    df = df.reset_index()
+    df = df.sort_values(by=["Net"], ascending=False)
+    return df.reset_index(drop=True)
+
+
+def game_advanced(box):
+    # One row per player per team-game, against that team-game's possessions.
+    keys = ["Season", "Team", "Game"]
+    team_poss = possessions(box[COUNTING].astype(float))
+    team_poss = team_poss.groupby([box[k] for k in keys], observed=True).transform("sum")
+
+    df = player_advanced(box.assign(GP=1), team_poss, by=BOX_KEYS)
+    return decode(df.drop(columns=["GP"]))
+
+
+def season_advanced(psums, tsums):
+    # Player-season lines use their team's possessions per game times the
+    # games they played.
+    per_game = possessions(tsums[COUNTING].astype(float)) / tsums["GP"]
+    team_poss = psums["Team"].map(dict(zip(tsums["Team"], per_game))).fillna(0.0) * psums["GP"]
+
+    df = player_advanced(psums, team_poss, by=("Player", "Team"))
+    df = df.sort_values(by=["USG%"], ascending=False)
+    return df.reset_index(drop=True)
+
+
+def record_sums(games, by=("Season", "Team")):
+    long = pd.concat(
+        [
+            pd.DataFrame({
+                "Season": games["Season"],
+                "Team": games["Home"],
+                "Margin": games["HScore"] - games["AScore"],
+            }),
+            pd.DataFrame({
+                "Season": games["Season"],
+                "Team": games["Away"],
+                "Margin": games["AScore"] - games["HScore"],
+            }),
         ],
+        ignore_index=True,
     )
+    long["Wins"] = (long["Margin"] >= 0).astype(int)
 
-    df = df.sort_values(by=["PTS"], ascending=False)
-    df = df.reset_index(drop=True)
+    grouped = long.groupby(list(by), sort=False)
 
-    return df
+    sums = grouped[["Wins", "Margin"]].sum()
+    sums.insert(0, "GP", grouped.size())
 
+    return decode(sums.reset_index())
 
-def compute_records():
-    teams = pd.read_csv(DATA / "s1" / "teams.csv")
 
-    records = []
-    for i, entry in teams.iterrows():
-        records.append(compute_record(entry["Team"]))
+def standings(sums, teams):
+    df = pd.DataFrame({"Team": teams["Team"]})
+    df = df.merge(sums[["Team", "GP", "Wins", "Margin"]], on="Team", how="left")
+    df[["GP", "Wins", "Margin"]] = df[["GP", "Wins", "Margin"]].fillna(0)
 
-    df = pd.DataFrame(records)
+    df["GP"] = df["GP"].astype(int)
+    df["Wins"] = df["Wins"].astype(int)
+    df["PCT"] = (df["Wins"] / df["GP"]).where(df["GP"] > 0, 0.0)
+    df["Margin"] = (df["Margin"] / df["GP"]).where(df["GP"] > 0, 0.0)
+
+    df = df[["Team", "GP", "Wins", "PCT", "Margin"]]
     df = df.sort_values(by=["PCT", "GP"], ascending=False)
     df = df.reset_index(drop=True)
 
     return df
 
 
-def compute_record(team):
-    record = {"Team": team, "GP": 0, "Wins": 0, "PCT": 0, "Margin": []}
+# Elo-style power ratings, applied one game at a time in the order the games
+# were played. K is scaled by the margin (damped when the favourite wins big)
+# and each season starts from last season's ratings, pulled toward the mean.
+ELO_MEAN = 1500.0
+ELO_K = 20.0
+ELO_CARRY = 0.75
+HISTORY = ["Order", "Date", "Team", "Opponent", "PTS", "OPP", "Before", "After"]
+
+
+def elo_change(rating, opponent, pts, opp):
+    # Points `rating` gains (and `opponent` loses) from one result.
+    expected = 1 / (1 + 10 ** ((opponent - rating) / 400))
+    actual = 1.0 if pts > opp else 0.0 if pts < opp else 0.5
+    favourite = (rating - opponent) if pts > opp else (opponent - rating)
+    scale = math.log(abs(pts - opp) + 1) * 2.2 / (favourite * 0.001 + 2.2)
+    return ELO_K * scale * (actual - expected)
+
+
+def carry_over(ratings):
+    # Season-start ratings from the previous season's final ones.
+    if ratings is None or ratings.empty:
+        return {}
+    return {
+        team: ELO_MEAN + ELO_CARRY * (elo - ELO_MEAN)
+        for team, elo in zip(ratings["Team"], ratings["Elo"])
+    }
+
+
+def same_start(history, start):
+    # Whether `history` was rated from the season-start ratings `start`.
+    first = history.sort_values("Order").drop_duplicates("Team")
+    return all(
+        math.isclose(before, start.get(team, ELO_MEAN))
+        for team, before in zip(first["Team"], first["Before"])
+    )
 
-    games = (DATA / "s1" / "games").glob("**/*")
-    for game in games:
-        teams = [t.split(".csv")[0] for t in game.name.split("-")[:2]]
-        if team in teams:
-            idx = teams.index(team)
-            rdf = pd.read_csv(game.absolute())
 
-            team_score = rdf.iloc[idx, 5]
-            high_score = rdf["Total"].max()
+def rated(previous, log, start):
+    # How many of `log`'s games `previous` already rated, in order and from
+    # the same starting ratings; 0 if it has to be replayed.
+    if previous is None or previous.empty:
+        return 0
 
-            record["GP"] += 1
-            if high_score == team_score:
-                record["Wins"] += 1
-                record["Margin"].append(high_score - rdf["Total"].min())
-            else:
-                record["Margin"].append(team_score - high_score)
+    done = int(previous["Order"].max())
+    expected = schedule(log[log["Order"] <= done])
+    keys = ["Order", "Team", "Opponent", "PTS", "OPP", "Date"]
+    ours = previous.sort_values(["Team", "Order"])[keys].reset_index(drop=True)
+    if len(expected) != len(ours) or not ours.astype(str).equals(expected[keys].astype(str)):
+        return 0
+
+    return done if same_start(previous, start) else 0
 
-    if record["GP"] != 0:
-        record["PCT"] = record["Wins"] / record["GP"]
-        record["Margin"] = sum(record["Margin"]) / len(record["Margin"])
-    else:
-        record["PCT"] = 0.0
-        record["Margin"] = 0.0
 
-    return record
+def rate(log, start=None, previous=None):
+    # Returns the season's rating history, two rows per game. Games `previous`
+    # already rated are kept as they are; only the rest are applied.
+    start = start or {}
+    done = rated(previous, log, start)
 
+    current = dict(start)
+    if done:
+        last = previous.sort_values("Order").drop_duplicates("Team", keep="last")
+        current.update(zip(last["Team"], last["After"]))
 
-def highs():
     made = []
+    for game in log[log["Order"] > done].itertuples(index=False):
+        away = current.get(game.Away, ELO_MEAN)
+        home = current.get(game.Home, ELO_MEAN)
+        change = elo_change(home, away, game.HScore, game.AScore)
+        current[game.Home] = home + change
+        current[game.Away] = away - change
+
+        made.append((game.Order, game.Date, game.Away, game.Home, game.AScore, game.HScore, away, away - change))
+        made.append((game.Order, game.Date, game.Home, game.Away, game.HScore, game.AScore, home, home + change))
+
+    df = pd.DataFrame.from_records(made, columns=HISTORY)
+    if done:
+        df = pd.concat([previous[HISTORY], df], ignore_index=True)
+    return df.sort_values(["Team", "Order"]).reset_index(drop=True)
+
+
+def ratings(history, teams, start=None):
+    # Every league team's current rating, best first.
+    start = start or {}
+    last = history.sort_values("Order").drop_duplicates("Team", keep="last").set_index("Team")
+
+    df = pd.DataFrame({"Team": teams["Team"]})
+    df["Elo"] = [last["After"].get(t, start.get(t, ELO_MEAN)) for t in df["Team"]]
+    df["Change"] = [last["After"].get(t, 0.0) - last["Before"].get(t, 0.0) for t in df["Team"]]
+    df["GP"] = df["Team"].map(history["Team"].value_counts()).fillna(0).astype(int)
+
+    df = df.sort_values(by=["Elo"], ascending=False)
+    return df.reset_index(drop=True)
+
+
+# Playoff odds: the rest of the season is played out `SIMULATIONS` times,
+# each game won with the probability the current ratings give it. Group
+# winners make the playoffs and are seeded first; the best of the rest fill
+# the field. Ties in wins go to point margin, then to a coin flip.
+SIMULATIONS = 20000
+PLAYOFF_TEAMS = 8
+# Simulations are run in batches of this many, each seeded from one
+# SeedSequence, so results don't depend on how many workers share them.
+BATCH = 5000
+SEED = 2022
+
+
+def remaining(season, log, teams):
+    # Games left to play: `schedule.csv` (Away, Home) if the season has one,
+    # else a single round robin between the league's teams, less the games
+    # already played between each pair.
+    filename = DATA / f"s{season}" / "schedule.csv"
+    if filename.exists():
+        planned = pd.read_csv(filename)[["Away", "Home"]]
+    else:
+        names = list(teams["Team"])
+        planned = pd.DataFrame(
+            [(away, home) for i, away in enumerate(names) for home in names[i + 1:]],
+            columns=["Away", "Home"],
+        )
 
-    recorded = {"PTS": 0, "3PM": 0, "REB": 0, "AST": 0, "STL": 0, "BLK": 0}
-    r_to_p = defaultdict(list)
-    for filename in (DATA / f"s1" / "boxscores").glob("**/*.csv"):
-        gdf = pd.read_csv(filename)
-        for k, v in recorded.items():
-            rdf = gdf.loc[gdf[k].idxmax()]
-            most = int(rdf[k])
-            if most > v:
-                recorded[k] = most
-                r_to_p[k] = [rdf["Player"]]
-            elif most == v:
-                r_to_p[k].append(rdf["Player"])
-
-    for k, v in recorded.items():
-        made.append({"Stat": k, "Player(s)": ", ".join(r_to_p[k]), "Record": v})
-
-    return pd.DataFrame(
-        made,
-        columns=[
-            "Stat",
-            "Player(s)",
-            "Record",
-        ],
+    def pairings(df):
+        # The n-th meeting of a pair, whichever side was home.
+        low = df["Away"].where(df["Away"] < df["Home"], df["Home"])
+        high = df["Home"].where(df["Away"] < df["Home"], df["Away"])
+        keys = low + "|" + high
+        return keys + "|" + keys.groupby(keys).cumcount().astype(str)
+
+    played = set(pairings(log)) if not log.empty else set()
+    left = planned[~pairings(planned).isin(played)]
+    return left.reset_index(drop=True)
+
+
+def simulate(batch, p_home, home, away, wins, margin, groups, playoff_teams=PLAYOFF_TEAMS):
+    # Plays out one batch of seasons at once, as (simulations x games) and
+    # (simulations x teams) arrays.
+    seed, size = batch
+    rng = np.random.default_rng(seed)
+    teams, games = len(wins), len(p_home)
+
+    # Win counts are tallied as float32 products, which BLAS runs far faster
+    # than integer ones and which stay exact at these sizes.
+    home_won = (rng.random((size, games)) < p_home).astype(np.float32)
+    on_home = np.zeros((games, teams), dtype=np.float32)
+    on_home[np.arange(games), home] = 1
+    on_away = np.zeros((games, teams), dtype=np.float32)
+    on_away[np.arange(games), away] = 1
+    total = wins + (home_won @ on_home + (1 - home_won) @ on_away).astype(np.int32)
+
+    # Best first by wins, then margin, then a coin flip.
+    flips = rng.random((size, teams))
+    order = np.lexsort((flips, np.broadcast_to(margin, (size, teams)), total), axis=1)[:, ::-1]
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.broadcast_to(np.arange(teams), (size, teams)), axis=1)
+
+    champion = np.zeros((size, teams), dtype=bool)
+    for group in range(groups.max() + 1):
+        members = np.where(groups == group, rank, teams)
+        champion[np.arange(size), members.argmin(axis=1)] = True
+
+    seeding = np.argsort(rank + teams * ~champion, axis=1)
+    seed_of = np.empty_like(seeding)
+    np.put_along_axis(seed_of, seeding, np.broadcast_to(np.arange(1, teams + 1), (size, teams)), axis=1)
+
+    return {
+        "Wins": total.sum(axis=0),
+        "Titles": champion.sum(axis=0),
+        "Seeds": np.stack([(seed_of == n).sum(axis=0) for n in range(1, playoff_teams + 1)], axis=1),
+    }
+
+
+def playoff_odds(season, log, teams, ratings, sums, simulations=SIMULATIONS, seed=SEED, workers=None):
+    names = list(teams["Team"])
+    index = {team: i for i, team in enumerate(names)}
+
+    left = remaining(season, log, teams)
+    left = left[left["Away"].isin(index) & left["Home"].isin(index)]
+    home = left["Home"].map(index).to_numpy(dtype=np.intp)
+    away = left["Away"].map(index).to_numpy(dtype=np.intp)
+
+    elo = np.array([dict(zip(ratings["Team"], ratings["Elo"])).get(t, ELO_MEAN) for t in names])
+    p_home = 1 / (1 + 10 ** ((elo[away] - elo[home]) / 400))
+
+    current = sums.set_index("Team").reindex(names)
+    wins = current["Wins"].fillna(0).to_numpy(dtype=np.int32)
+    margin = current["Margin"].fillna(0).to_numpy(dtype=float)
+    groups = pd.factorize(teams["Group"])[0]
+
+    sizes = [min(BATCH, simulations - start) for start in range(0, simulations, BATCH)]
+    batches = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+    results = read_all(
+        functools.partial(
+            simulate, p_home=p_home, home=home, away=away, wins=wins, margin=margin, groups=groups
+        ),
+        batches,
+        workers,
     )
 
+    df = pd.DataFrame({"Team": names, "Group": teams["Group"].to_numpy(), "Wins": wins})
+    df["Left"] = np.bincount(np.concatenate([home, away]), minlength=len(names))
+    df["Proj"] = sum(r["Wins"] for r in results) / simulations
+    seeds = sum(r["Seeds"] for r in results) / simulations
+    df["Playoffs"] = seeds.sum(axis=1)
+    df["Group Title"] = sum(r["Titles"] for r in results) / simulations
+    for n in range(PLAYOFF_TEAMS):
+        df[f"Seed {n + 1}"] = seeds[:, n]
+
+    df = df.sort_values(by=["Playoffs", "Proj"], ascending=False)
+    return df.reset_index(drop=True)
+
+
+# Single-game records are kept as the top `TOP_K` lines per season, team and
+# stat; league-wide records are exact from the union of every team's top K.
+RECORD_STATS = {
+    "PTS": ["PTS"],
+    "3PM": ["3PM"],
+    "REB": ["REB"],
+    "AST": ["AST"],
+    "STL": ["STL"],
+    "BLK": ["BLK"],
+    "PTS+REB+AST": ["PTS", "REB", "AST"],
+    "PTS+REB": ["PTS", "REB"],
+    "PTS+AST": ["PTS", "AST"],
+    "REB+AST": ["REB", "AST"],
+    "STL+BLK": ["STL", "BLK"],
+}
+TOP_K = 10
+RECORDS = ["Season", "Team", "Stat", "Rank", "Value", "Player", "Opponent", "Game"]
+
+
+def read_heaps(index):
+    # Heap entries order by value and then by the earlier game, so a tie at
+    # the K-th place keeps whoever set it first.
+    heaps = defaultdict(list)
+    for r in index.itertuples(index=False):
+        entry = (int(r.Value), -int(r.Season), -int(r.Game), r.Player, r.Opponent)
+        heaps[(int(r.Season), r.Team, r.Stat)].append(entry)
+    for heap in heaps.values():
+        heapq.heapify(heap)
+    return heaps
+
+
+def push_records(heaps, box):
+    if box.empty:
+        return heaps
+
+    for stat, columns in RECORD_STATS.items():
+        values = box[columns].sum(axis=1)
+        lines = zip(box["Season"], box["Team"], box["Game"], box["Player"], box["Opponent"], values)
+        for season, team, game, player, opponent, value in lines:
+            heap = heaps[(int(season), team, stat)]
+            entry = (int(value), -int(season), -int(game), player, opponent)
+            if len(heap) < TOP_K:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    return heaps
+
+
+def top_records(box, previous=None, rebuild=()):
+    # Folds new boxscore rows into a `previous` index in O(log K) each. A heap
+    # can't forget a line, so teams that lost rows (`rebuild`) are recomputed
+    # from `box`, which must then hold all of their current rows.
+    if previous is None:
+        heaps = push_records(defaultdict(list), box)
+    else:
+        heaps = read_heaps(previous[~previous["Team"].isin(rebuild)])
+        heaps = push_records(heaps, box)
 
-if __name__ == "__main__":
-    engine = create_engine(st.secrets["DB_URL"])
+    order = {stat: i for i, stat in enumerate(RECORD_STATS)}
+    made = []
+    for season, team, stat in sorted(heaps, key=lambda k: (k[0], k[1], order[k[2]])):
+        ranked = sorted(heaps[(season, team, stat)], reverse=True)
+        for rank, (value, _, game, player, opponent) in enumerate(ranked, start=1):
+            made.append({
+                "Season": season,
+                "Team": team,
+                "Stat": stat,
+                "Rank": rank,
+                "Value": value,
+                "Player": player,
+                "Opponent": opponent,
+                "Game": -game,
+            })
+
+    return pd.DataFrame.from_records(made, columns=RECORDS)
+
+
+def holders(index):
+    # The best line per stat, naming every player (once per game) who hit it.
+    made = []
+    for stat in RECORD_STATS:
+        sdf = index[index["Stat"] == stat]
+        best = int(sdf["Value"].max()) if not sdf.empty else 0
 
-    stats_df = summary(season=1)
+        sdf = sdf[sdf["Value"] == best].sort_values(["Season", "Game", "Team", "Rank"])
+        made.append({"Stat": stat, "Player(s)": ", ".join(sdf["Player"]), "Record": best})
 
-    standings_df = compute_records()
-    standings_df.to_sql(name="Standings", con=engine, if_exists='replace')
-    # standings_df.to_csv("build/standings.csv", sep=',', index=False)
+    return pd.DataFrame(made, columns=["Stat", "Player(s)", "Record"])
 
-    pts_df = leaders("PTS", ["Player", "GP", "PTS"], stats_df)
-    pts_df.to_sql(name="PTS", con=engine, if_exists='replace')
 
-    fgp_df = leaders("FG%", ["Player", "GP", "FG%", "FGM"], stats_df)
-    fgp_df.to_sql(name="FGP", con=engine, if_exists='replace')
+def highs(season, index):
+    return holders(index[index["Season"] == season])
 
-    ast_df = leaders("AST", ["Player", "GP", "AST"], stats_df)
-    ast_df.to_sql(name="AST", con=engine, if_exists='replace')
 
-    tmp_df = leaders("3PG", ["Player", "GP", "3PG"], stats_df)
-    tmp_df.to_sql(name="TPG", con=engine, if_exists='replace')
+# `games.json` holds the replay links and quarter breakdowns for this team's
+# games, keyed by season and then game number.
+REPLAYS = "Blood Tigers"
 
-    tpp_df = leaders("3P%", ["Player", "GP", "3P%", "3PM"], stats_df)
-    tpp_df.to_sql(name="TPP", con=engine, if_exists='replace')
 
-    reb_df = leaders("TRB", ["Player", "GP", "TRB"], stats_df)
-    reb_df.to_sql(name="REB", con=engine, if_exists='replace')
+def catalog(season=1, box=None):
+    if box is None:
+        box = boxscore_index(season)
+        box["Path"] = box["Path"].map(relpath)
 
-    blk_df = leaders("BLK", ["Player", "GP", "BLK"], stats_df)
-    blk_df.to_sql(name="BLK", con=engine, if_exists='replace')
+    replays = {}
+    filename = DATA / f"s{season}" / "games.json"
+    if filename.exists():
+        with open(filename, "r") as f:
+            replays = json.load(f).get(str(season), {})
 
-    stl_df = leaders("STL", ["Player", "GP", "STL"], stats_df)
-    stl_df.to_sql(name="STL", con=engine, if_exists='replace')
+    df = box.drop_duplicates(["Season", "Team", "Game"])
+    df = df[["Season", "Team", "Game", "Opponent", "Path"]].copy()
+    df = df.rename(columns={"Path": "Boxscore"})
+
+    made = []
+    for row in df.itertuples(index=False):
+        entry = replays.get(str(row.Game), {}) if row.Team == REPLAYS else {}
+        made.append({
+            "Title": entry.get("title", f"{row.Team} vs. {row.Opponent}"),
+            "Stream": entry.get("stream", ""),
+            "Breakdown": json.dumps(entry.get("breakdown", [])),
+        })
+
+    made = pd.DataFrame(made, columns=["Title", "Stream", "Breakdown"])
+    df = pd.concat([df.reset_index(drop=True), made], axis=1)
+    df = df.sort_values(by=["Season", "Team", "Game"])
+    df = df.reset_index(drop=True)
 
-    high_df = highs()
-    high_df.to_sql(name="Highs", con=engine, if_exists='replace')
+    return df[["Season", "Team", "Game", "Opponent", "Title", "Stream", "Breakdown", "Boxscore"]]
 
-    total_df = totals()
-    total_df.to_sql(name="Team", con=engine, if_exists='replace')
 
-    opp_df = op_totals()
-    opp_df.to_sql(name="Opponent", con=engine, if_exists='replace')
+def differential(total_df, opp_df):
+    stats = ["FGM", "FGA", "FG%", "3PM", "3PA", "3P%", "TRB", "AST", "STL", "BLK", "TOV", "PTS"]
 
-    rows = []
-    for i, row in total_df.iterrows():
-        team = row["Team"]
-        entry = {"Team": team, "GP": row["GP"]}
-        for k in ["FGM", "FGA", "FG%", "3PM", "3PA", "3P%", "TRB", "AST", "STL", "BLK", "TOV", "PTS"]:
-            i = row[k] - opp_df.loc[opp_df["Team"] == team, k]
-            entry[k] = list(i)[0]
-        rows.append(entry)
+    own = total_df.set_index("Team")
+    opp = opp_df.set_index("Team").reindex(own.index)
 
-    diff_df = pd.DataFrame(rows)
+    diff_df = own[stats] - opp[stats]
+    diff_df.insert(0, "GP", own["GP"])
+
+    diff_df = diff_df.reset_index()
     diff_df = diff_df.sort_values(by=["PTS"], ascending=False)
     diff_df = diff_df.reset_index(drop=True)
-    diff_df.to_sql(name="Differential", con=engine, if_exists='replace')
 
-    games_df = recent_games()
-    games_df.to_sql(name="Games", con=engine, if_exists='replace')
+    return diff_df
+
+
+# Incremental builds keep a manifest of every source file plus the parsed rows
+# and running sums derived from them. Only files whose content changed since
+# the last run are re-read; their old contribution is subtracted from the sums
+# and the new one added before the published tables are re-derived.
+MANIFEST = ["Path", "Season", "Kind", "Size", "MTime", "Hash"]
+
+SUMS = {
+    "PlayerSums": ["Season", "Team", "Player"],
+    "TeamSums": ["Season", "Team"],
+    "OpponentSums": ["Season", "Opponent"],
+    "RecordSums": ["Season", "Team"],
+}
+# What each of them sums, so a season with no rows yet still has every column.
+SUMMED = {
+    "PlayerSums": ["GP"] + COUNTING,
+    "TeamSums": ["GP"] + COUNTING,
+    "OpponentSums": ["GP"] + COUNTING,
+    "RecordSums": ["GP", "Wins", "Margin"],
+}
+
+
+def relpath(filename):
+    return filename.relative_to(DATA).as_posix()
+
+
+def file_hash(path):
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+# Source files of a season, by kind, relative to `csv/s<N>`.
+SOURCES = [
+    ("boxscore", "boxscores/*/*.csv"),
+    ("game", "games/*.csv"),
+    ("replays", "games.json"),
+    ("teams", "teams.csv"),
+    ("dates", "dates.csv"),
+    ("schedule", "schedule.csv"),
+]
+# Source files every season depends on, relative to `csv/`.
+SHARED = [
+    ("aliases", "aliases.csv"),
+]
+
+
+def scan(season=1, known=None, workers=None, hold=()):
+    seen = {}
+    if known is not None:
+        seen = {row.Path: row for row in known.itertuples(index=False)}
 
-    players_df = players()
-    players_df.to_sql(name="Players", con=engine, if_exists='replace')
+    made = []
+    root = DATA / f"s{season}"
+    sources = [(kind, root, pattern) for kind, pattern in SOURCES]
+    sources += [(kind, DATA, pattern) for kind, pattern in SHARED]
+    unhashed = []
+    for kind, base, pattern in sources:
+        for filename in sorted(base.glob(pattern)):
+            path = relpath(filename)
+
+            # Held files keep their last published version, if they have one.
+            if path in hold:
+                if path in seen:
+                    made.append(seen[path]._asdict())
+                continue
+
+            stat = filename.stat()
+
+            # Only hash files whose size or mtime moved since the last run.
+            entry = seen.get(path)
+            if entry is not None and (entry.Size, entry.MTime) == (stat.st_size, stat.st_mtime_ns):
+                digest = entry.Hash
+            else:
+                digest = None
+                unhashed.append((len(made), filename))
+
+            made.append({
+                "Path": path,
+                "Season": season,
+                "Kind": kind,
+                "Size": stat.st_size,
+                "MTime": stat.st_mtime_ns,
+                "Hash": digest,
+            })
+
+    digests = read_all(file_hash, [filename for _, filename in unhashed], workers)
+    for (i, _), digest in zip(unhashed, digests):
+        made[i]["Hash"] = digest
+
+    return pd.DataFrame.from_records(made, columns=MANIFEST)
+
+
+def read_state(engine, name, season=None):
+    if not inspect(engine).has_table(name):
+        return None
+    if season is None:
+        return pd.read_sql_table(name, engine)
+
+    # Every state table is partitioned by season; only read the one we need.
+    query = text(f'SELECT * FROM "{name}" WHERE "Season" = :season')
+    with engine.connect() as conn:
+        return pd.read_sql_query(query, conn, params={"season": season})
+
+
+def career(engine, season, psums):
+    # Career lines are folded from each season's per-player partial sums, so
+    # closed seasons are never re-read from their boxscores.
+    columns = ", ".join(f'SUM("{c}") AS "{c}"' for c in ["GP"] + COUNTING)
+
+    earlier = None
+    if inspect(engine).has_table("PlayerSums"):
+        query = text(
+            f'SELECT "Player", {columns} FROM "PlayerSums" '
+            f'WHERE "Season" != :season GROUP BY "Player"'
+        )
+        with engine.connect() as conn:
+            earlier = pd.read_sql_query(query, conn, params={"season": season})
+
+    current = psums.groupby("Player", as_index=False, sort=False, observed=True)[["GP"] + COUNTING].sum()
+    sums = fold(earlier, None, current, ["Player"], ["GP"] + COUNTING)
+
+    df = player_rates(sums)
+    df = df.sort_values(by=["PTS"], ascending=False)
+    df = df.reset_index(drop=True)
+
+    return df
+
+
+def read_rows(engine, name, paths):
+    if not paths:
+        return pd.DataFrame()
+
+    query = text(f'SELECT * FROM "{name}" WHERE "Path" IN :paths')
+    query = query.bindparams(bindparam("paths", expanding=True))
+    with engine.connect() as conn:
+        return pd.read_sql_query(query, conn, params={"paths": list(paths)})
+
+
+def fold(sums, removed, added, by, values=("GP",)):
+    parts = [df for df in (sums, added) if df is not None and not df.empty]
+    if removed is not None and not removed.empty:
+        removed = removed.copy()
+        values = [c for c in removed.columns if c not in by]
+        removed[values] = -removed[values]
+        parts.append(removed)
+
+    if not parts:
+        return pd.DataFrame(columns=list(by) + list(values)).astype(dict.fromkeys(values, "int64"))
+
+    df = pd.concat(parts, ignore_index=True)
+    df = df.groupby(list(by), as_index=False, sort=False, observed=True).sum()
+
+    return df[df["GP"] > 0].reset_index(drop=True)
+
+
+def state_sums(name, box, games):
+    by = SUMS[name]
+    if name == "PlayerSums":
+        return player_sums(box, by=by) if not box.empty else None
+    elif name == "TeamSums":
+        return team_sums(box, by=by) if not box.empty else None
+    elif name == "OpponentSums":
+        box = opponent_rows(box) if not box.empty else box
+        return team_sums(box, by=by) if not box.empty else None
+    return record_sums(games, by=by) if not games.empty else None
+
+
+def tables(state, season=1, touched=None):
+    teams = load_teams(season)
+
+    # Per-team tables are only re-derived for the `touched` teams, if given.
+    def mine(df):
+        return df if touched is None else df[df["Team"].isin(touched)]
+
+    box_df = state["BoxscoreRows"]
+    box_df = box_df[box_df["Season"] == season]
+    games_df = state["GameRows"]
+    games_df = games_df[games_df["Season"] == season]
+
+    psums = state["PlayerSums"]
+    psums = psums[psums["Season"] == season]
+
+    with stage("summary", rows_in=len(psums)) as s:
+        by_player = psums.groupby("Player", as_index=False, sort=False, observed=True)[["GP"] + COUNTING].sum()
+        stats_df = player_rates(by_player)
+        stats_df = stats_df.sort_values(by=["PTS"], ascending=False)
+        stats_df = stats_df.reset_index(drop=True)
+        s["RowsOut"] = len(stats_df)
+
+    rsums = state["RecordSums"]
+    rsums = rsums[rsums["Season"] == season]
+    with stage("standings", rows_in=len(rsums)) as s:
+        standings_df = standings(rsums, teams)
+        s["RowsOut"] = len(standings_df)
+
+    with stage("leaders", rows_in=len(stats_df)) as s:
+        leaders_df = leaderboard(stats_df)
+        s["RowsOut"] = len(leaders_df)
+
+    index_df = state["Records"]
+    with stage("highs", rows_in=len(index_df)) as s:
+        highs_df = highs(season, index=index_df)
+        s["RowsOut"] = len(highs_df)
+
+    with stage("catalog", rows_in=len(box_df)) as s:
+        catalog_df = catalog(season, box=mine(box_df))
+        s["RowsOut"] = len(catalog_df)
+
+    tsums = state["TeamSums"]
+    tsums = tsums[(tsums["Season"] == season) & tsums["Team"].isin(teams["Team"])]
+    with stage("totals", rows_in=len(tsums)) as s:
+        total_df = team_rates(tsums)
+        total_df = total_df.sort_values(by=["PTS"], ascending=False)
+        total_df = total_df.reset_index(drop=True)
+        s["RowsOut"] = len(total_df)
+
+    osums = state["OpponentSums"]
+    osums = osums[(osums["Season"] == season) & osums["Opponent"].isin(teams["Team"])]
+    with stage("op_totals", rows_in=len(osums)) as s:
+        opp_df = team_rates(osums.rename(columns={"Opponent": "Team"}))
+        opp_df = opp_df.sort_values(by=["PTS"], ascending=True)
+        opp_df = opp_df.reset_index(drop=True)
+        s["RowsOut"] = len(opp_df)
+
+    with stage("differential", rows_in=len(total_df) + len(opp_df)) as s:
+        diff_df = differential(total_df, opp_df)
+        s["RowsOut"] = len(diff_df)
+
+    with stage("games", rows_in=len(games_df)) as s:
+        recent_df = recent_games(season, games=games_df)
+        schedule_df = schedule(recent_df)
+        s["RowsOut"] = len(recent_df) + len(schedule_df)
+
+    with stage("players", rows_in=len(psums)) as s:
+        players_df = player_rates(
+            mine(psums[psums["Team"].isin(teams["Team"])]), by=("Player", "Team")
+        ).drop(columns=["3PG"])
+        s["RowsOut"] = len(players_df)
+
+    with stage("advanced", rows_in=len(psums) + len(box_df)) as s:
+        advanced_df = season_advanced(mine(psums[psums["Team"].isin(teams["Team"])]), tsums)
+        team_advanced_df = team_advanced(tsums, osums)
+        game_advanced_df = game_advanced(mine(box_df))
+        s["RowsOut"] = len(advanced_df) + len(team_advanced_df) + len(game_advanced_df)
+
+    # Every team in a boxscore gets a row, so the core's foreign keys hold
+    # for opponents from outside the league's groups too.
+    seen = pd.concat([box_df["Team"], box_df["Opponent"], teams["Team"]]).astype(str).unique()
+    teams_df = pd.DataFrame({"Season": season, "Team": seen})
+    teams_df = teams_df.merge(teams[["Team", "Group"]], on="Team", how="left")
+
+    return {
+        "Teams": teams_df,
+        "Standings": standings_df,
+        "Leaders": leaders_df,
+        "Highs": highs_df,
+        "Records": mine(index_df),
+        "Catalog": catalog_df,
+        "Team": total_df,
+        "Opponent": opp_df,
+        "Differential": diff_df,
+        "Games": recent_df,
+        "Schedule": schedule_df,
+        "Players": players_df,
+        "Ratings": state["Ratings"],
+        "RatingHistory": state["RatingHistory"],
+        "Odds": state["Odds"],
+        "Advanced": advanced_df,
+        "TeamAdvanced": team_advanced_df,
+        "GameAdvanced": game_advanced_df,
+    }
+
+
+# Tables an incremental update restages only in part: the per-team ones for
+# the teams whose boxscores changed, each game log from the first game whose
+# rows changed, and the leaderboards of the stats whose boards changed.
+TEAM_TABLES = ["Records", "Catalog", "Players", "Advanced", "GameAdvanced"]
+LOGS = {
+    "Games": ["Order"],
+    "Schedule": ["Order", "Team"],
+    "RatingHistory": ["Order", "Team"],
+}
+
+
+def rows(df, by):
+    # Sorted rows as plain tuples, with missing values as None, so rows read
+    # back from the database compare equal to freshly derived ones.
+    df = df.sort_values(by, kind="stable").astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def first_change(previous, df, by):
+    # The first `by[0]` at which `df` differs from the published rows, or
+    # None if it doesn't.
+    at = list(df.columns).index(by[0])
+    old, new = rows(previous[list(df.columns)], by), rows(df, by)
+    for a, b in zip(old, new):
+        if a != b:
+            return min(a[at], b[at])
+    if len(old) == len(new):
+        return None
+    return max(old, new, key=len)[min(len(old), len(new))][at]
+
+
+def narrow(engine, published, season, touched, paths):
+    # Cuts `published` down to the rows that changed and returns the scope
+    # each of them replaces. Tables whose layout changed are left whole.
+    scopes = {}
+
+    def same_layout(name):
+        previous = read_state(engine, name, season)
+        if previous is None or sorted(previous.columns) != sorted(published[name].columns):
+            return None
+        return previous
+
+    for name in TEAM_TABLES:
+        scopes[name] = ('"Team" IN :teams', {"teams": sorted(touched)})
+
+    for name, by in LOGS.items():
+        previous = same_layout(name)
+        if previous is None:
+            continue
+        order = first_change(previous, published[name], by)
+        if order is None:
+            del published[name]
+            continue
+        df = published[name]
+        published[name] = df[df["Order"] >= order]
+        scopes[name] = ('"Order" >= :order', {"order": int(order)})
+
+    previous = same_layout("Leaders")
+    if previous is not None:
+        df = published["Leaders"]
+        by = ["Stat", "MinGP", "Rank"]
+        previous = previous[list(df.columns)]
+        stats = [
+            stat for stat in sorted(set(df["Stat"]) | set(previous["Stat"]))
+            if rows(df[df["Stat"] == stat], by) != rows(previous[previous["Stat"] == stat], by)
+        ]
+        published["Leaders"] = df[df["Stat"].isin(stats)]
+        scopes["Leaders"] = ('"Stat" IN :stats', {"stats": stats})
+
+    df = published["Manifest"]
+    published["Manifest"] = df[df["Path"].isin(paths)]
+    scopes["Manifest"] = ('"Path" IN :paths', {"paths": sorted(paths)})
+
+    # Nothing to restage: leave the table as published.
+    for name, (_, params) in list(scopes.items()):
+        if any(v == [] for v in params.values()):
+            del published[name], scopes[name]
+    return scopes
+
+
+def update(engine, season=1, full=False, workers=None, hold=()):
+    # Returns the stage metrics of the run, or None when nothing changed.
+    with collect() as stages:
+        if not refresh(engine, season, full, workers, hold):
+            return None
+
+    df = pd.DataFrame.from_records(stages, columns=STAGE_COLUMNS)
+    return df.astype({"RowsIn": "Int64", "RowsOut": "Int64", "Files": "Int64"})
+
+
+def refresh(engine, season, full, workers, hold):
+    known = None if full or legacy(engine) else read_state(engine, "Manifest", season)
+    if known is None or known.empty:
+        full = True
+        known = pd.DataFrame(columns=MANIFEST)
+
+    # New games are dated before the scan, so `dates.csv` is published
+    # alongside them.
+    if relpath(dates_path(season)) not in hold:
+        record_dates(season)
+
+    with stage("scan", rows_in=len(known)) as s:
+        current = scan(season, known, workers, hold)
+        s["Files"] = len(current)
+        s["RowsOut"] = len(current)
+
+    old = dict(zip(known["Path"], known["Hash"]))
+    new = dict(zip(current["Path"], current["Hash"]))
+
+    # `stale` files had rows folded in before (and must be subtracted) while
+    # `fresh` files have rows that need to be folded in now.
+    stale = [p for p, h in old.items() if new.get(p) != h]
+    fresh = [p for p, h in new.items() if old.get(p) != h]
+    if not full and not stale and not fresh:
+        # Nothing in this season changed, but it's still re-rated if last
+        # season's final ratings moved since it started from them.
+        history = read_state(engine, "RatingHistory", season)
+        if history is None or same_start(history, carry_over(read_state(engine, "Ratings", season - 1))):
+            return None
+
+    # New aliases can rename players in any file: rebuild the season from
+    # every file that isn't held back.
+    shared = {p for _, p in SHARED}
+    if any(p in shared for p in stale + fresh):
+        full = True
+        fresh = [p for p in current["Path"] if p not in hold]
+
+    # A full rebuild keeps held files at their last published rows (scan
+    # kept their manifest entries), renamed through the current aliases.
+    kept = [p for p in current["Path"] if p in hold] if full else []
+
+    kinds = dict(zip(current["Path"], current["Kind"]))
+    fresh_box = [DATA / p for p in fresh if kinds[p] == "boxscore"]
+    fresh_games = [DATA / p for p in fresh if kinds[p] == "game"]
+
+    with stage("load_boxscores") as s:
+        if full and not hold:
+            added_box = load_boxscores(season, workers=workers)
+        else:
+            added_box = load_boxscores(season, paths=fresh_box, workers=workers)
+        if kept:
+            rows = read_rows(engine, "BoxscoreRows", kept)
+            if not rows.empty:
+                rows["Player"] = rows["Player"].replace(canonical_names())
+                added_box = pd.concat([added_box, rows], ignore_index=True)
+        s["Files"] = len(fresh_box)
+        s["RowsOut"] = len(added_box)
+
+    with stage("load_games") as s:
+        added_games = load_games(season, paths=fresh_games, workers=workers)
+        if kept:
+            added_games = pd.concat([added_games, read_rows(engine, "GameRows", kept)], ignore_index=True)
+        s["Files"] = len(fresh_games)
+        s["RowsOut"] = len(added_games)
+
+    with stage("fold", rows_in=len(added_box) + len(added_games)) as s:
+        if full:
+            removed_box, removed_games = pd.DataFrame(), pd.DataFrame()
+        else:
+            removed_box = read_rows(engine, "BoxscoreRows", stale)
+            removed_games = read_rows(engine, "GameRows", stale)
+
+        state = {}
+        for name, by in SUMS.items():
+            previous = None if full else read_state(engine, name, season)
+            state[name] = fold(
+                previous,
+                state_sums(name, removed_box, removed_games),
+                state_sums(name, added_box, added_games),
+                by,
+                SUMMED[name],
+            )
+        s["RowsOut"] = sum(len(df) for df in state.values())
+
+    if full:
+        where = ('"Season" = :season', {"season": season})
+    else:
+        where = ('"Path" IN :paths', {"paths": stale})
+
+    # Source rows are only ever appended or deleted by path, but the derived
+    # tables below still need the full post-update view of them.
+    changes = []
+    for name, added in [("BoxscoreRows", added_box), ("GameRows", added_games)]:
+        changes.append((name, where, added))
+
+        rows = None if full else read_state(engine, name, season)
+        if rows is not None:
+            rows = rows[~rows["Path"].isin(stale)]
+        state[name] = pd.concat([rows, added], ignore_index=True)
+
+    with stage("records", rows_in=len(added_box)) as s:
+        previous = None if full else read_state(engine, "Records", season)
+        if previous is None:
+            state["Records"] = top_records(state["BoxscoreRows"])
+        else:
+            # Only the heaps of teams whose boxscores changed are read back:
+            # teams that lost rows are rebuilt from their post-update rows,
+            # the rest only have the new rows pushed in. Every other team's
+            # records stand as published.
+            lost = set(removed_box["Team"]) if not removed_box.empty else set()
+            gained = set(added_box["Team"]) if not added_box.empty else set()
+            rows = state["BoxscoreRows"]
+            box = pd.concat(
+                [added_box[~added_box["Team"].isin(lost)], rows[rows["Team"].isin(lost)]],
+                ignore_index=True,
+            )
+            mine = previous["Team"].isin(lost | gained)
+            state["Records"] = pd.concat(
+                [previous[~mine], top_records(box, previous[mine], rebuild=lost)], ignore_index=True
+            )
+        s["RowsOut"] = len(state["Records"])
+
+    with stage("ratings", rows_in=len(state["GameRows"])) as s:
+        # New games that sort after every rated one cost one update each;
+        # anything else (an edit, a late-dated game, a new start) replays
+        # the season.
+        start = carry_over(read_state(engine, "Ratings", season - 1))
+        previous = None if full else read_state(engine, "RatingHistory", season)
+        log = recent_games(season, games=state["GameRows"])
+        state["RatingHistory"] = rate(log, start, previous)
+        state["Ratings"] = ratings(state["RatingHistory"], load_teams(season), start)
+        s["RowsOut"] = len(state["RatingHistory"])
+
+    with stage("odds", rows_in=len(log)) as s:
+        rsums = state["RecordSums"]
+        state["Odds"] = playoff_odds(
+            season, log, load_teams(season), state["Ratings"], rsums[rsums["Season"] == season], workers=workers
+        )
+        s["RowsOut"] = len(state["Odds"])
+
+    # Boxscores (and the replays file) only feed the per-team tables of
+    # their own teams; a changed teams.csv can move every team's rows.
+    changed = set(stale + fresh)
+    kinds = {**dict(zip(known["Path"], known["Kind"])), **kinds}
+    touched = None
+    if not full and "teams" not in {kinds[p] for p in changed} and all(
+        inspect(engine).has_table(name) for name in TEAM_TABLES
+    ):
+        touched = {str(t) for df in (added_box, removed_box) if not df.empty for t in df["Team"].unique()}
+        if "replays" in {kinds[p] for p in changed}:
+            touched.add(REPLAYS)
+
+    published = {}
+    for name, df in tables(state, season, touched).items():
+        df = df.reset_index(drop=True)
+        if "Season" not in df.columns:
+            df.insert(0, "Season", season)
+        published[name] = df
+    published["Manifest"] = current
+    for name in SUMS:
+        published[name] = state[name]
+    with stage("career", rows_in=len(state["PlayerSums"])) as s:
+        published["Career"] = career(engine, season, state["PlayerSums"])
+        s["RowsOut"] = len(published["Career"])
+
+    scopes = {}
+    if touched is not None:
+        with stage("narrow", rows_in=sum(len(df) for df in published.values())) as s:
+            scopes = narrow(engine, published, season, touched, changed)
+            s["RowsOut"] = sum(len(df) for df in published.values())
+
+    publish(engine, published, changes=changes, season=season, scopes=scopes)
+    return True
+
+
+# Secondary indexes created on published tables after they're swapped in.
+# Every partitioned table is indexed on `Season` first so reads and publishes
+# only ever touch one season's rows.
+INDEXES = {
+    # Covers every column so a leaderboard is answered from the index alone.
+    "Leaders": ["Season", "Stat", "MinGP", "Rank", "Player", "GP", "Value", "Made"],
+    # Per-team payloads read by the team pages.
+    "Players": ["Season", "Team"],
+    "Advanced": ["Season", "Team"],
+    "GameAdvanced": ["Season", "Team", "Game"],
+    "Records": ["Season", "Team", "Stat", "Rank"],
+    # Game logs, paged newest first by (Date, Order) keyset.
+    "Games": ["Season", "Date", "Order"],
+    "Schedule": ["Season", "Team", "Date", "Order"],
+    "RatingHistory": ["Season", "Team", "Order"],
+    # Keyed by the core's primary key.
+    "Teams": [],
+    "Catalog": ["Season", "Team", "Game"],
+    "GameRows": ["Season", "Path"],
+    "Manifest": ["Season", "Path"],
+    "Career": ["Player"],
+}
+
+
+# The normalized core: a fact row per player per team-game, keyed to the
+# dimension tables. `BoxscoreRows` is a view over it with the columns (and
+# order) of the raw boxscores. Foreign keys are checked at commit, so a
+# season's partition can be replaced inside one publish.
+CORE = [
+    """
+    CREATE TABLE IF NOT EXISTS "Teams" (
+        "Season" INTEGER NOT NULL,
+        "Team" TEXT NOT NULL,
+        "Group" TEXT,
+        PRIMARY KEY ("Season", "Team")
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "Gamertags" (
+        "PlayerId" INTEGER PRIMARY KEY,
+        "Player" TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "TeamGames" (
+        "Season" INTEGER NOT NULL,
+        "Team" TEXT NOT NULL,
+        "Game" INTEGER NOT NULL,
+        "Opponent" TEXT NOT NULL,
+        "Path" TEXT NOT NULL UNIQUE,
+        PRIMARY KEY ("Season", "Team", "Game"),
+        FOREIGN KEY ("Season", "Team") REFERENCES "Teams" ("Season", "Team")
+            DEFERRABLE INITIALLY DEFERRED,
+        FOREIGN KEY ("Season", "Opponent") REFERENCES "Teams" ("Season", "Team")
+            DEFERRABLE INITIALLY DEFERRED
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS "PlayerGames" (
+        "Season" INTEGER NOT NULL,
+        "Team" TEXT NOT NULL,
+        "Game" INTEGER NOT NULL,
+        "PlayerId" INTEGER NOT NULL,
+        "Line" INTEGER NOT NULL,
+        {", ".join(f'"{c}" INTEGER NOT NULL' for c in BOX_STATS)},
+        PRIMARY KEY ("Season", "Team", "Game", "PlayerId"),
+        FOREIGN KEY ("Season", "Team", "Game") REFERENCES "TeamGames" ("Season", "Team", "Game")
+            DEFERRABLE INITIALLY DEFERRED,
+        FOREIGN KEY ("PlayerId") REFERENCES "Gamertags" ("PlayerId")
+            DEFERRABLE INITIALLY DEFERRED
+    )
+    """,
+    # Per-opponent views and per-player game logs are answered from these
+    # alone; per-team-game reads use the primary keys.
+    """
+    CREATE INDEX IF NOT EXISTS "ix_TeamGames_Opponent"
+        ON "TeamGames" ("Season", "Opponent", "Team", "Game")
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS "ix_PlayerGames_Player"
+        ON "PlayerGames" ("PlayerId", "Season", "Team", "Game", {", ".join(f'"{c}"' for c in BOX_STATS)})
+    """,
+    f"""
+    CREATE VIEW IF NOT EXISTS "BoxscoreRows" AS
+    SELECT g."Season", g."Team", g."Game", g."Opponent", p."Player",
+        {", ".join(f's."{c}"' for c in BOX_STATS)}, g."Path"
+    FROM "PlayerGames" s
+    JOIN "TeamGames" g ON g."Season" = s."Season" AND g."Team" = s."Team" AND g."Game" = s."Game"
+    JOIN "Gamertags" p ON p."PlayerId" = s."PlayerId"
+    ORDER BY g."Season", g."Team", g."Game", s."Line"
+    """,
+]
+
+
+def legacy(engine):
+    # Databases from before the core stored boxscore rows in a plain table.
+    return "BoxscoreRows" in inspect(engine).get_table_names()
+
+
+def schema(conn):
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+
+    if legacy(conn):
+        # Every season is re-ingested into the core: forgetting the manifest
+        # makes the next update of each season a full one.
+        for name in ["BoxscoreRows", "Teams", "Manifest"]:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+
+    for statement in CORE:
+        conn.execute(text(statement))
+
+
+def facts(conn, where, params, box):
+    # Replaces the team-games matched by `where` with those in `box`.
+    query = text(
+        f'DELETE FROM "PlayerGames" WHERE ("Season", "Team", "Game") IN '
+        f'(SELECT "Season", "Team", "Game" FROM "TeamGames" WHERE {where})'
+    )
+    conn.execute(bound(query, params), params)
+    conn.execute(bound(text(f'DELETE FROM "TeamGames" WHERE {where}'), params), params)
+
+    if box.empty:
+        return
+
+    names = [{"player": p} for p in box["Player"].astype(str).unique()]
+    conn.execute(
+        text('INSERT INTO "Gamertags" ("Player") VALUES (:player) ON CONFLICT ("Player") DO NOTHING'),
+        names,
+    )
+    query = text('SELECT "PlayerId", "Player" FROM "Gamertags" WHERE "Player" IN :names')
+    query = query.bindparams(bindparam("names", expanding=True))
+    ids = pd.read_sql_query(query, conn, params={"names": [n["player"] for n in names]})
+
+    box = box.astype({"Team": str, "Opponent": str, "Player": str, "Path": str})
+    games = box.drop_duplicates(["Season", "Team", "Game"])
+    write(games[["Season", "Team", "Game", "Opponent", "Path"]], "TeamGames", conn)
+
+    lines = box.merge(ids, on="Player", how="left")
+    lines["Line"] = lines.groupby("Path", sort=False).cumcount()
+    write(lines[["Season", "Team", "Game", "PlayerId", "Line"] + BOX_STATS], "PlayerGames", conn)
+
+
+# SQLite's default limit on bound parameters in a single statement.
+MAX_VARIABLES = 999
+
+
+def bound(query, params):
+    # List parameters (paths, teams, ...) bind as `IN :name` lists.
+    lists = [bindparam(k, expanding=True) for k, v in params.items() if isinstance(v, list)]
+    return query.bindparams(*lists) if lists else query
+
+
+def write(df, name, conn):
+    chunksize = max(1, MAX_VARIABLES // max(1, len(df.columns)))
+    df.to_sql(
+        name=name,
+        con=conn,
+        if_exists="append",
+        index=False,
+        chunksize=chunksize,
+        method="multi",
+    )
+
+
+def index(name, conn):
+    if not inspect(conn).has_table(name):
+        return
+
+    keys = INDEXES.get(name, ["Season"])
+    if not keys:
+        return
+    if keys[0] == "Season" and "Season" not in [c["name"] for c in inspect(conn).get_columns(name)]:
+        return
+
+    columns = ", ".join(f'"{c}"' for c in keys)
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{name}" ON "{name}" ({columns})'))
+
+
+def swap(name, conn, season=None, scope=None):
+    staging = f"_staging_{name}"
+    if season is None or not inspect(conn).has_table(name):
+        conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+        conn.execute(text(f'ALTER TABLE "{staging}" RENAME TO "{name}"'))
+        return
+
+    # The staged rows replace this season's partition, or only the part of
+    # it matched by `scope`, a (where, params) pair.
+    where, params = '"Season" = :season', {"season": season}
+    if scope is not None:
+        where, params = f"{where} AND ({scope[0]})", {**params, **scope[1]}
+
+    old = [c["name"] for c in inspect(conn).get_columns(name)]
+    new = [c["name"] for c in inspect(conn).get_columns(staging)]
+    if old != new:
+        # The table's layout changed: carry every other row over into the
+        # staged copy (a one-off cost) and swap the whole table.
+        query = bound(text(f'SELECT * FROM "{name}" WHERE NOT ({where})'), params)
+        rest = pd.read_sql_query(query, conn, params=params)
+        write(rest.reindex(columns=new), staging, conn)
+        return swap(name, conn)
+
+    columns = ", ".join(f'"{c}"' for c in new)
+    conn.execute(bound(text(f'DELETE FROM "{name}" WHERE {where}'), params), params)
+    conn.execute(text(f'INSERT INTO "{name}" ({columns}) SELECT {columns} FROM "{staging}"'))
+    conn.execute(text(f'DROP TABLE "{staging}"'))
+
+
+def publish(engine, tables, changes=(), season=None, scopes=None):
+    # Everything is written in one transaction: each table is staged under a
+    # temporary name and only swapped in once every table has been written,
+    # so readers see either the previous publish or this one, never a mix.
+    # Tables with a `Season` column are partitioned by it, and only the
+    # partition for `season` (or the part of it in `scopes`) is replaced.
+    scopes = scopes or {}
+    report = []
+    with engine.begin() as conn:
+        schema(conn)
+
+        for name, (where, params), added in changes:
+            with stage(f"to_sql:{name}", rows_in=len(added)) as s:
+                if name == "BoxscoreRows":
+                    facts(conn, where, params, added)
+                else:
+                    if inspect(conn).has_table(name):
+                        conn.execute(bound(text(f'DELETE FROM "{name}" WHERE {where}'), params), params)
+                    if not added.empty:
+                        write(added, name, conn)
+                    index(name, conn)
+                s["RowsOut"] = len(added)
+            report.append({"Table": name, "Rows": len(added), "Seconds": s["Seconds"]})
+
+        for name, df in tables.items():
+            with stage(f"to_sql:{name}", rows_in=len(df)) as s:
+                staging = f"_staging_{name}"
+                conn.execute(text(f'DROP TABLE IF EXISTS "{staging}"'))
+                write(df, staging, conn)
+                s["RowsOut"] = len(df)
+            report.append({"Table": name, "Rows": len(df), "Seconds": s["Seconds"]})
+
+        with stage("swap", rows_in=len(tables)):
+            for name, df in tables.items():
+                swap(name, conn, season if "Season" in df.columns else None, scopes.get(name))
+                index(name, conn)
+
+    return pd.DataFrame.from_records(report, columns=["Table", "Rows", "Seconds"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="ignore the manifest and rebuild every table from scratch",
+    )
+    parser.add_argument(
+        "--season",
+        type=int,
+        action="append",
+        help="only update this season (may be repeated; defaults to all)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="read source files with this many workers (defaults to serial)",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="use a process pool rather than threads for --workers",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also record each stage's peak traced memory (several times slower)",
+    )
+    args = parser.parse_args()
+
+    WORKERS = args.workers
+    EXECUTOR = "process" if args.processes else "thread"
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    engine = create_engine(st.secrets["DB_URL"])
 
+    started = datetime.datetime.now()
+    stages = []
+    for season in args.season or seasons():
+        with collect() as run:
+            with stage("compact"):
+                compact(season)
+            report = update(engine, season=season, full=args.full)
+        stages.extend({"Season": season, **s} for s in run)
+
+        if report is None:
+            print(f"Season {season}: nothing to publish, no source files changed.")
+        else:
+            print(f"Season {season}:")
+            print(report.to_string(index=False))
+
+    run = record_run(stages, started, args=vars(args))
+    print(f"Run took {run['Seconds']:.2f}s; stage metrics appended to {RUNS}.")
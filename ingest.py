@@ -0,0 +1,405 @@
+import json
+import time
+import argparse
+import pathlib
+import datetime
+import threading
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import create_engine
+
+import names
+import compute
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # without watchdog the tree is polled instead
+    Observer = None
+    FileSystemEventHandler = object
+
+# Seconds without a new write before a burst of files is ingested; the OCR
+# scrape writes a game's boxscores and quarter lines one after another.
+DEBOUNCE = 2.0
+# Seconds between checks for a settled burst (and between polls).
+INTERVAL = 0.25
+
+def source(filename):
+    # Returns (season, kind) for files `compute.scan` picks up, else None.
+    # Shared files have no season: they belong to every one.
+    try:
+        path = pathlib.PurePosixPath(compute.relpath(pathlib.Path(filename)))
+    except ValueError:
+        return None
+
+    for kind, pattern in compute.SHARED:
+        if str(path) == pattern:
+            return None, kind
+
+    season = path.parts[0][1:] if path.parts else ""
+    if not season.isdigit():
+        return None
+
+    rest = pathlib.PurePosixPath(*path.parts[1:])
+    for kind, pattern in compute.SOURCES:
+        if len(rest.parts) == len(pattern.split("/")) and rest.match(pattern):
+            return int(season), kind
+    return None
+
+
+def counts(df, columns):
+    values = df[columns].apply(pd.to_numeric, errors="coerce")
+    if values.isna().any().any() or (values < 0).any().any() or (values % 1 != 0).any().any():
+        return None
+    return values.astype(int)
+
+
+def validate_boxscore(filename):
+    if not compute.BOXSCORE_NAME.match(filename.stem):
+        return ["expected a name like g<N>-<Opponent>.csv"]
+
+    df = pd.read_csv(filename)
+    if list(df.columns) != compute.BOXSCORE_FILE:
+        return [f"expected columns {compute.BOXSCORE_FILE}, found {list(df.columns)}"]
+    if df.empty:
+        return ["no player lines"]
+
+    problems = []
+    if df["Player"].isna().any() or df["Player"].duplicated().any():
+        problems.append("blank or repeated player names")
+
+    stats = counts(df, compute.BOX_STATS)
+    if stats is None:
+        return problems + ["stats must be non-negative whole numbers"]
+
+    shots = zip(df["Player"], stats["PTS"], stats["FGM"], stats["FGA"], stats["3PM"], stats["3PA"])
+    for player, pts, fgm, fga, tpm, tpa in shots:
+        if fgm > fga or tpm > tpa or tpm > fgm:
+            problems.append(f"{player}: made shots exceed attempts")
+        elif pts < 2 * fgm + tpm:
+            problems.append(f"{player}: PTS is less than 2*FGM + 3PM")
+
+    return problems
+
+
+def validate_game(filename):
+    names = filename.stem.split("-")
+    if len(names) not in (2, 3) or (len(names) == 3 and not names[2].isdigit()):
+        return ["expected a name like <Away>-<Home>[-<N>].csv"]
+
+    df = pd.read_csv(filename)
+    if list(df.columns) != compute.GAME_FILE:
+        return [f"expected columns {compute.GAME_FILE}, found {list(df.columns)}"]
+    if list(df["Team"]) != names[:2]:
+        return [f"expected lines for {names[0]} then {names[1]}, found {list(df['Team'])}"]
+
+    scores = counts(df, compute.GAME_FILE[1:])
+    if scores is None:
+        return ["scores must be non-negative whole numbers"]
+    # Overtime points only show up in the total.
+    if (scores["Total"] < scores[compute.QUARTERS].sum(axis=1)).any():
+        return ["a total is less than the sum of its quarters"]
+
+    return []
+
+
+def validate_dates(filename):
+    df = pd.read_csv(filename, dtype=str)
+    if list(df.columns) != compute.DATES:
+        return [f"expected columns {compute.DATES}, found {list(df.columns)}"]
+    if df["Game"].isna().any() or df["Game"].duplicated().any():
+        return ["blank or repeated games"]
+    if pd.to_datetime(df["Date"], format="%Y-%m-%d", errors="coerce").isna().any():
+        return ["dates must be written YYYY-MM-DD"]
+    return []
+
+
+def validate(filename, kind):
+    try:
+        if kind == "boxscore":
+            return validate_boxscore(filename)
+        elif kind == "game":
+            return validate_game(filename)
+        elif kind == "dates":
+            return validate_dates(filename)
+        elif kind == "replays":
+            with open(filename, "r") as f:
+                json.load(f)
+        elif kind == "teams":
+            if list(pd.read_csv(filename).columns) != ["Team", "Group"]:
+                return ["expected columns ['Team', 'Group']"]
+        elif kind == "aliases":
+            if list(pd.read_csv(filename).columns) != compute.ALIASES:
+                return [f"expected columns {compute.ALIASES}"]
+        elif kind == "schedule":
+            if list(pd.read_csv(filename).columns) != ["Away", "Home"]:
+                return ["expected columns ['Away', 'Home']"]
+    except (ValueError, pd.errors.ParserError) as e:
+        return [f"unreadable: {e}"]
+    return []
+
+
+class Pending:
+    # Files touched since the last ingest, with when each first landed.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.landed = {}
+        self.last = 0.0
+
+    def add(self, filename):
+        if source(filename) is None:
+            return
+        now = time.time()
+        with self.lock:
+            self.landed.setdefault(pathlib.Path(filename), now)
+            self.last = now
+
+    def take(self, debounce=DEBOUNCE):
+        with self.lock:
+            if not self.landed or time.time() - self.last < debounce:
+                return {}
+            batch, self.landed = self.landed, {}
+        return batch
+
+    def restore(self, batch):
+        # Puts a failed batch back, to be retried once writes settle again.
+        with self.lock:
+            for filename, landed in batch.items():
+                self.landed[filename] = min(landed, self.landed.get(filename, landed))
+            self.last = time.time()
+
+
+class Handler(FileSystemEventHandler):
+    def __init__(self, pending):
+        self.pending = pending
+
+    def on_any_event(self, event):
+        # Reads show up as opened/closed events too; only writes matter.
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                self.pending.add(path)
+
+
+def sources(season):
+    for kind, pattern in compute.SOURCES:
+        for filename in (compute.DATA / f"s{season}").glob(pattern):
+            yield filename, kind
+    for kind, pattern in compute.SHARED:
+        for filename in compute.DATA.glob(pattern):
+            yield filename, kind
+
+
+def snapshot():
+    return {
+        filename: (filename.stat().st_size, filename.stat().st_mtime_ns)
+        for season in compute.seasons()
+        for filename, _ in sources(season)
+    }
+
+
+def poll(pending, stop, interval=INTERVAL):
+    before = snapshot()
+    while not stop.wait(interval):
+        after = snapshot()
+        for filename in set(before) | set(after):
+            if before.get(filename) != after.get(filename):
+                pending.add(filename)
+        before = after
+
+
+def changed(engine, season):
+    # Paths (relative to `csv/`) whose content differs from what was last
+    # published. A checkout or `touch` moves the mtime but not the hash.
+    known = compute.read_state(engine, "Manifest", season)
+    known = {} if known is None else {r.Path: r for r in known.itertuples(index=False)}
+
+    made = {}
+    for filename, kind in sources(season):
+        stat = filename.stat()
+        entry = known.get(compute.relpath(filename))
+        if entry is not None and (entry.Size, entry.MTime) == (stat.st_size, stat.st_mtime_ns):
+            continue
+        if entry is not None and entry.Hash == compute.file_hash(filename):
+            continue
+        made[filename] = kind
+    return made
+
+
+def ingest(engine, season, landed, held):
+    # Validates what changed in `season`, publishes everything that passed and
+    # returns the run record. Invalid boxscores and games are held back at
+    # their last published version; any other invalid file holds the season.
+    started = datetime.datetime.now()
+
+    different = {compute.relpath(f): kind for f, kind in changed(engine, season).items()}
+    for path, kind in different.items():
+        problems = validate(compute.DATA / path, kind)
+        if problems:
+            if path not in held:
+                print(f"Holding {path}: {'; '.join(problems)}")
+            held[path] = kind
+        elif held.pop(path, None):
+            print(f"Releasing {path}")
+
+    # Held files that are gone, or back to their published content, have
+    # nothing left to hold back.
+    for path in [p for p in held if p.startswith(f"s{season}/") or "/" not in p]:
+        if not (compute.DATA / path).exists():
+            del held[path]
+        elif path not in different:
+            print(f"Releasing {path}")
+            del held[path]
+
+    hold = {p for p in held if p.startswith(f"s{season}/") or "/" not in p}
+    if any(held[p] not in ("boxscore", "game") for p in hold):
+        return None
+
+    with compute.collect() as run:
+        report = compute.update(engine, season=season, hold=hold)
+    if report is None:
+        return None
+
+    visible = time.time()
+    stages = [{"Season": season, **s} for s in run]
+    latency = visible - min(landed) if landed else None
+    run = compute.record_run(
+        stages,
+        started,
+        args={"source": "ingest", "season": season, "held": sorted(hold)},
+        Files=len(landed),
+        Latency=latency,
+    )
+
+    if latency is not None:
+        print(f"Season {season}: published {len(landed)} file(s), {latency:.2f}s after landing.")
+    return run
+
+
+class Upkeep:
+    # Work that keeps later runs fast but isn't needed to publish: refreshing
+    # the columnar store for full loads and matching new gamertags. It runs on
+    # its own thread, so the next batch never waits on it.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.seasons = set()
+        self.boxscores = set()
+        # Built from every season on its first run, then kept.
+        self.names = names.Learner()
+
+    def add(self, seasons, batch=()):
+        with self.lock:
+            self.seasons.update(seasons)
+            self.boxscores.update(f for f in batch if source(f)[1] == "boxscore")
+        self.wake.set()
+
+    def run(self, stop):
+        while not stop.is_set():
+            if not self.wake.wait(INTERVAL):
+                continue
+            with self.lock:
+                self.wake.clear()
+                seasons, self.seasons = self.seasons, set()
+                boxscores, self.boxscores = self.boxscores, set()
+
+            try:
+                for season in sorted(seasons):
+                    compute.compact(season)
+                # New aliases land in the shared table, which brings the
+                # seasons they touch back through `settle`.
+                self.names.learn(boxscores)
+            except Exception as e:
+                # Picked up again with the next batch.
+                print(f"Upkeep of season(s) {sorted(seasons)} failed: {e!r}")
+                with self.lock:
+                    self.seasons.update(seasons)
+                    self.boxscores.update(boxscores)
+
+
+def settle(engine, batch, held):
+    # Publishes a batch and returns the seasons it touched.
+    by_season = {}
+    for filename, landed in batch.items():
+        season, _ = source(filename)
+        for season in [season] if season is not None else compute.seasons():
+            by_season.setdefault(season, []).append(landed)
+
+    for season, landed in sorted(by_season.items()):
+        ingest(engine, season, landed, held)
+    return set(by_season)
+
+
+def watch(engine, debounce=DEBOUNCE, polling=False):
+    pending = Pending()
+    stop = threading.Event()
+
+    if Observer is None or polling:
+        watcher = threading.Thread(target=poll, args=(pending, stop), daemon=True)
+        watcher.start()
+    else:
+        watcher = Observer()
+        watcher.schedule(Handler(pending), str(compute.DATA), recursive=True)
+        watcher.start()
+
+    upkeep = Upkeep()
+    worker = threading.Thread(target=upkeep.run, args=(stop,), daemon=True)
+    worker.start()
+
+    held = {}
+    # Catch up on anything that landed while the service was down.
+    try:
+        for season in compute.seasons():
+            ingest(engine, season, [], held)
+    except Exception as e:
+        print(f"Catching up failed, retrying: {e!r}")
+        # Any one source of a season brings all of its changes through.
+        pending.restore({compute.DATA / f"s{season}" / "teams.csv": time.time() for season in compute.seasons()})
+    print(f"Watching {compute.DATA} for new boxscores and games.")
+    upkeep.add(compute.seasons())
+
+    try:
+        while True:
+            time.sleep(INTERVAL)
+            batch = pending.take(debounce)
+            if not batch:
+                continue
+
+            # A file deleted mid-read or a locked database fails the batch,
+            # not the service: it's put back and retried.
+            try:
+                upkeep.add(settle(engine, batch, held), batch)
+            except Exception as e:
+                print(f"Ingest of {len(batch)} file(s) failed, retrying: {e!r}")
+                pending.restore(batch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        worker.join()
+        if isinstance(watcher, threading.Thread):
+            watcher.join()
+        else:
+            watcher.stop()
+            watcher.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE,
+        help="seconds to wait for a burst of writes to settle",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="poll the tree rather than using filesystem events",
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(st.secrets["DB_URL"])
+    watch(engine, debounce=args.debounce, polling=args.poll)
@@ -0,0 +1,216 @@
+import os
+import csv
+import argparse
+import collections
+
+import pandas as pd
+
+import compute
+
+# Trigrams are taken over the casefolded tag, padded so the first and last
+# characters count as much as the middle ones.
+Q = 3
+
+
+def max_distance(name):
+    # OCR tends to get one character of a tag wrong; longer tags get two.
+    return 1 if len(name) < 10 else 2
+
+
+def grams(name):
+    padded = "^" * (Q - 1) + name.casefold() + "$" * (Q - 1)
+    return {padded[i:i + Q] for i in range(len(padded) - Q + 1)}
+
+
+def levenshtein(a, b, limit):
+    # Edit distance, given up on (as `limit + 1`) once every cell of a row
+    # is past `limit`.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    # An inverted trigram index over canonical tags. An edit touches at most
+    # Q trigrams, so a tag within `d` edits of a name shares all but Q * d of
+    # the name's trigrams; only tags passing that count are compared
+    # character by character. Tags are kept as read but compared without
+    # case, so ones differing only in case are 0 edits apart.
+    def __init__(self, names=()):
+        self.postings = collections.defaultdict(set)
+        self.names = set()
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        if name in self.names:
+            return
+        self.names.add(name)
+        for gram in grams(name):
+            self.postings[gram].add(name)
+
+    def search(self, name, distance=None):
+        # Returns [(distance, tag)] for every other tag within `distance`.
+        distance = max_distance(name) if distance is None else distance
+        own = grams(name)
+
+        shared = collections.Counter()
+        for gram in own:
+            shared.update(self.postings.get(gram, ()))
+
+        made = []
+        for other, n in shared.items():
+            if other == name or n < len(own) - Q * distance:
+                continue
+            d = levenshtein(name.casefold(), other.casefold(), distance)
+            if d <= distance:
+                made.append((d, other))
+        return sorted(made)
+
+
+def pool(seasons=None):
+    # Every (canonical) player line on file, across seasons.
+    frames = [
+        compute.load_boxscores(season, columns=["Season", "Team", "Game", "Player"])
+        for season in (seasons or compute.seasons())
+    ]
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=["Season", "Team", "Game", "Player"])
+    return compute.decode(pd.concat(frames, ignore_index=True))
+
+
+def match(box, aliases=None, index=None, tags=None):
+    # Resolves every tag in `box` against the rest, most-played first: a tag
+    # is a new player when nothing is close, an alias of the one close tag
+    # that has played more games for one of its teams, and up for review
+    # otherwise. Tags that shared a boxscore are never the same player.
+    # Given an `index` of tags already resolved, only `tags` are matched
+    # against it (and added to it).
+    aliases = compute.read_aliases() if aliases is None else aliases
+    listed = set(aliases["Alias"])
+
+    box = box.assign(Key=list(zip(box["Season"], box["Team"], box["Game"])))
+    played = box.groupby("Player", sort=False)
+    gp = played["Key"].nunique()
+    teams = played["Team"].agg(set)
+    games = played["Key"].agg(set)
+
+    index = NameIndex() if index is None else index
+    tags = gp.index if tags is None else [t for t in tags if t in gp.index]
+    made = []
+    for name in sorted(tags, key=lambda n: (-gp[n], n)):
+        if name in listed or name in index:
+            continue
+
+        close = [
+            other
+            for _, other in index.search(name)
+            if not games[name] & games[other]
+        ]
+        if not close:
+            index.add(name)
+            continue
+
+        if len(close) == 1 and gp[close[0]] > gp[name] and teams[name] & teams[close[0]]:
+            made.append({"Alias": name, "Player": close[0], "Status": "auto"})
+        else:
+            made.append({"Alias": name, "Player": " | ".join(close), "Status": "review"})
+            index.add(name)
+
+    return pd.DataFrame.from_records(made, columns=compute.ALIASES)
+
+
+def record(found):
+    # Appends newly found aliases to the shared table.
+    if found.empty:
+        return found
+
+    # Written aside and swapped in, so a run reading the table meanwhile
+    # never sees half a row.
+    filename = compute.aliases_path()
+    staging = filename.with_suffix(".tmp")
+    with open(staging, "w", newline="") as f:
+        if filename.exists():
+            f.write(filename.read_text())
+        found.to_csv(f, header=not filename.exists(), index=False, quoting=csv.QUOTE_ALL)
+    os.replace(staging, filename)
+    return found
+
+
+class Learner:
+    # Matches tags as boxscores land. The first call resolves every season
+    # on file; later ones keep its player lines and index of canonical tags
+    # and only match tags of the files given that aren't already known.
+    def __init__(self, seasons=None):
+        self.seasons = seasons
+        self.box = None
+        self.index = NameIndex()
+
+    def landed(self, filenames):
+        # Swaps the lines of `filenames` (gone ones included) into the kept
+        # ones and returns their tags.
+        keys, frames = set(), []
+        for filename in filenames:
+            season = int(compute.relpath(filename).split("/")[0][1:])
+            keys.add((season, filename.parent.name, compute.parse_boxscore_name(filename)[0]))
+            if filename.exists():
+                frames.append(compute.load_boxscores(season, paths=[filename], columns=list(self.box.columns)))
+
+        kept = pd.Series(list(zip(self.box["Season"], self.box["Team"], self.box["Game"])), dtype=object)
+        self.box = pd.concat([self.box[~kept.isin(keys).to_numpy()]] + frames, ignore_index=True)
+        return {tag for df in frames for tag in df["Player"]}
+
+    def learn(self, filenames=None):
+        aliases = compute.read_aliases()
+        if self.box is None:
+            self.box, tags = pool(self.seasons), None
+        else:
+            tags = self.landed(filenames or [])
+            if not tags:
+                return pd.DataFrame(columns=compute.ALIASES)
+            # Aliases found (or confirmed) since apply to the kept lines too.
+            self.box["Player"] = self.box["Player"].replace(compute.canonical_names())
+
+        found = record(match(self.box, aliases, self.index, tags))
+        for row in found.itertuples(index=False):
+            if row.Status == "review":
+                print(f"Review {row.Alias!r}: could be {row.Player}")
+            else:
+                print(f"Aliasing {row.Alias!r} to {row.Player!r}")
+        return found
+
+
+def learn(seasons=None):
+    return Learner(seasons).learn()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print what would be added to the alias table without writing it",
+    )
+    args = parser.parse_args()
+
+    if args.dry_run:
+        print(match(pool()).to_string(index=False))
+    else:
+        found = learn()
+        print(f"{len(found)} alias(es) added to {compute.aliases_path()}.")
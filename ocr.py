@@ -0,0 +1,363 @@
+import os
+import re
+import csv
+import json
+import time
+import difflib
+import hashlib
+import argparse
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+
+import names
+import compute
+
+try:
+    from ExtractTable import ExtractTable
+except ImportError:  # only the hosted backend needs it
+    ExtractTable = None
+
+# Screenshots are filed like the boxscores they become:
+# `screenshots/s<N>/<Team>/g<N>-<Opponent>.png`.
+SCREENSHOTS = pathlib.Path("screenshots")
+IMAGES = {".png", ".jpg", ".jpeg"}
+CACHE = compute.BUILD / "ocr"
+# Which game file each screenshot's quarter lines went to, and quarter lines
+# that disagree with the other team's screenshot of the same game.
+CLAIMS = CACHE / "games.json"
+REVIEW = CACHE / "review"
+
+# Extraction jobs in flight at once, and attempts per image.
+CONCURRENCY = 4
+RETRIES = 3
+
+# Shooting is read as made/attempted pairs; every other stat stands alone.
+SHOTS = [("FGM", "FGA"), ("3PM", "3PA")]
+COUNTS = [c for c in compute.BOX_STATS if c not in {s for pair in SHOTS for s in pair}]
+
+
+class ExtractTableBackend:
+    name = "extracttable"
+
+    def __init__(self, api_key):
+        if ExtractTable is None:
+            raise RuntimeError("the extracttable package is not installed")
+        self.api_key = api_key
+
+    def extract(self, filename):
+        # One client per job: the SDK keeps per-request state on the instance.
+        client = ExtractTable(api_key=self.api_key)
+        return client.process_file(filepath=str(filename), output_format="df")
+
+
+class LocalBackend:
+    # A stand-in for tests and offline runs: returns the tables recorded in
+    # an `<image>.json` sidecar, each a list of rows as OCR would see them.
+    name = "local"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def extract(self, filename):
+        time.sleep(self.delay)
+        with open(filename.with_suffix(".json"), "r") as f:
+            return [pd.DataFrame(rows) for rows in json.load(f)]
+
+
+def image_hash(filename):
+    return hashlib.sha256(filename.read_bytes()).hexdigest()
+
+
+def grid(table):
+    return [["" if pd.isna(v) else str(v).strip() for v in row] for row in table.values.tolist()]
+
+
+def extract(backend, filename, digest):
+    cached = CACHE / f"{backend.name}-{digest}.json"
+    if cached.exists():
+        with open(cached, "r") as f:
+            return json.load(f), True
+
+    for attempt in range(RETRIES):
+        try:
+            tables = backend.extract(filename)
+            break
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+    grids = [grid(t) for t in tables]
+
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    staging = cached.with_suffix(".tmp")
+    with open(staging, "w") as f:
+        json.dump(grids, f)
+    os.replace(staging, cached)
+
+    return grids, False
+
+
+# Characters OCR commonly reads in place of digits.
+DIGITS = str.maketrans({"O": "0", "o": "0", "D": "0", "l": "1", "I": "1", "|": "1", "S": "5", "B": "8"})
+
+
+def number(text):
+    digits = re.sub(r"[^0-9]", "", text.translate(DIGITS))
+    return int(digits) if digits else 0
+
+
+def header(rows, *names):
+    for i, row in enumerate(rows):
+        cells = [c.upper().replace(" ", "") for c in row]
+        if all(any(n in c for c in cells) for n in names):
+            return i, cells
+    return None, None
+
+
+def players(rows):
+    i, cells = header(rows, "PTS", "REB")
+    if i is None:
+        return None
+
+    def find(name):
+        return next((j for j, c in enumerate(cells) if c == name or c.startswith(name + "/")), None)
+
+    made = []
+    for row in rows[i + 1:]:
+        name = row[0].strip()
+        if not name or name.upper() in ("TOTAL", "TOTALS", "TEAM"):
+            continue
+
+        line = {"Player": name}
+        for column in COUNTS:
+            j = find(column)
+            line[column] = number(row[j]) if j is not None else 0
+        # Shooting is shown as made/attempted pairs, or as separate columns.
+        for made_col, att_col in SHOTS:
+            j = find(made_col)
+            if j is not None and "/" in row[j]:
+                shots = row[j].split("/")
+                line[made_col], line[att_col] = number(shots[0]), number(shots[1])
+            else:
+                k = find(att_col)
+                line[made_col] = number(row[j]) if j is not None else 0
+                line[att_col] = number(row[k]) if k is not None else 0
+        made.append(line)
+
+    return pd.DataFrame(made, columns=compute.BOXSCORE_FILE)
+
+
+def team_name(label, candidates):
+    label = label.lower()
+    for team in candidates:
+        if label and (label in team.lower() or team.lower() in label):
+            return team
+    return max(candidates, key=lambda t: difflib.SequenceMatcher(None, label, t.lower()).ratio())
+
+
+def quarters(rows, team, opponent):
+    i = next(
+        (i for i, row in enumerate(rows)
+         if {"1", "1ST"} & {c.upper() for c in row} and {"4", "4TH"} & {c.upper() for c in row}),
+        None,
+    )
+    if i is None:
+        return None
+
+    lines = [r for r in rows[i + 1:] if r and r[0].strip()][:2]
+    if len(lines) != 2:
+        return None
+
+    # The away team is listed first; OCR'd labels are mapped onto the two
+    # teams the screenshot was filed under.
+    made = []
+    for row in lines:
+        name = team_name(row[0], [team, opponent])
+        scores = [number(c) for c in row[1:] if c.strip()]
+        made.append({"Team": name, **dict(zip(compute.QUARTERS, scores[:4])), "Total": scores[-1]})
+
+    df = pd.DataFrame(made, columns=compute.GAME_FILE)
+    if df["Team"].nunique() != 2:
+        df["Team"] = [df["Team"][0], opponent if df["Team"][0] == team else team]
+    return df
+
+
+def to_csv(df):
+    return df.to_csv(index=False, quoting=csv.QUOTE_ALL)
+
+
+def save(text, filename):
+    # Written whole and only when changed, so the ingest watcher sees one
+    # complete write per new file.
+    if filename.exists() and filename.read_text() == text:
+        return False
+
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    staging = filename.with_name(f".{filename.name}.tmp")
+    staging.write_text(text)
+    os.replace(staging, filename)
+    return True
+
+
+def game_file(season, away, home, text):
+    # Rematches get a `-<N>` suffix.
+    games = compute.DATA / f"s{season}" / "games"
+    for n in range(1, 100):
+        filename = games / (f"{away}-{home}.csv" if n == 1 else f"{away}-{home}-{n}.csv")
+        if not filename.exists() or filename.read_text() == text:
+            return filename
+    raise ValueError(f"too many games between {away} and {home}")
+
+
+def read_claims():
+    if not CLAIMS.exists():
+        return {}
+    with open(CLAIMS, "r") as f:
+        return json.load(f)
+
+
+def write_claims(claims):
+    CLAIMS.parent.mkdir(parents=True, exist_ok=True)
+    staging = CLAIMS.with_suffix(".tmp")
+    with open(staging, "w") as f:
+        json.dump(claims, f, indent=2, sort_keys=True)
+    os.replace(staging, CLAIMS)
+
+
+def meetings(season, team, opponent, also=()):
+    # The team's game numbers against `opponent`, in the order they played.
+    played = set(also)
+    for filename in (compute.DATA / f"s{season}" / "boxscores" / team).glob("g*.csv"):
+        game, against = compute.parse_boxscore_name(filename)
+        if against == opponent:
+            played.add(game)
+    return sorted(played)
+
+
+def paired(season, team, game, opponent, claims):
+    # The game file this screenshot's game already has, if either side's
+    # screenshot wrote one. Both teams' screenshots of the n-th meeting
+    # between them are the same game.
+    key = f"s{season}/{team}/g{game}"
+    if key in claims:
+        return claims[key]
+
+    n = meetings(season, team, opponent, also=[game]).index(game)
+    theirs = meetings(season, opponent, team)
+    if n < len(theirs):
+        return claims.get(f"s{season}/{opponent}/g{theirs[n]}")
+    return None
+
+
+def write(filename, grids, root=SCREENSHOTS):
+    path = filename.resolve().relative_to(root.resolve())
+    season = int(path.parts[0][1:])
+    team = path.parts[1]
+    game, opponent = compute.parse_boxscore_name(path)
+
+    box = next((df for df in map(players, grids) if df is not None), None)
+    line = next((df for df in (quarters(rows, team, opponent) for rows in grids) if df is not None), None)
+    if box is None or line is None:
+        raise ValueError("no boxscore or quarter table found")
+
+    made = {}
+    boxscore = compute.DATA / f"s{season}" / "boxscores" / team / f"g{game}-{opponent}.csv"
+    made["Boxscore"] = compute.relpath(boxscore) if save(to_csv(box), boxscore) else None
+
+    # The quarter lines go to this game's file, wherever the other team's
+    # screenshot put it. If the two reads disagree, the game isn't written
+    # again as a rematch: this read waits in `REVIEW` for someone to settle.
+    text = to_csv(line)
+    claims = read_claims()
+    path = paired(season, team, game, opponent, claims)
+    scores = compute.DATA / path if path else game_file(season, line["Team"][0], line["Team"][1], text)
+
+    if scores.exists() and scores.read_text() != text:
+        save(text, REVIEW / f"s{season}-{team}-g{game}.csv")
+        made["Game"] = None
+        made["Status"] = f"review: quarter lines differ from {compute.relpath(scores)}"
+        return made
+
+    made["Game"] = compute.relpath(scores) if save(text, scores) else None
+    claims[f"s{season}/{team}/g{game}"] = compute.relpath(scores)
+    write_claims(claims)
+
+    return made
+
+
+def find(root=SCREENSHOTS):
+    return sorted(
+        filename
+        for filename in root.glob("s*/*/g*-*.*")
+        if filename.suffix.lower() in IMAGES and compute.BOXSCORE_NAME.match(filename.stem)
+    )
+
+
+def run(paths, backend, workers=CONCURRENCY, root=SCREENSHOTS):
+    # The same screenshot is often posted more than once; each distinct
+    # image is extracted once, on at most `workers` concurrent jobs.
+    jobs = {}
+    report = []
+    for filename in paths:
+        digest = image_hash(filename)
+        if digest in jobs:
+            report.append({"Image": str(filename), "Hash": digest[:12], "Status": "duplicate"})
+            continue
+        jobs[digest] = filename
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {digest: pool.submit(extract, backend, filename, digest) for digest, filename in jobs.items()}
+
+        for digest, future in futures.items():
+            filename = jobs[digest]
+            made = {"Image": str(filename), "Hash": digest[:12]}
+            try:
+                grids, cached = future.result()
+                made.update(write(filename, grids, root))
+                made.setdefault("Status", "cached" if cached else "extracted")
+            except Exception as e:
+                made["Status"] = f"failed: {e}"
+            report.append(made)
+
+    return pd.DataFrame.from_records(report, columns=["Image", "Hash", "Status", "Boxscore", "Game"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        type=pathlib.Path,
+        help="screenshots to ingest (defaults to everything under --root)",
+    )
+    parser.add_argument("--root", type=pathlib.Path, default=SCREENSHOTS)
+    parser.add_argument(
+        "--backend",
+        choices=["extracttable", "local"],
+        default="extracttable",
+        help="OCR backend; `local` reads `<image>.json` sidecars",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=CONCURRENCY,
+        help="extraction jobs to run at once",
+    )
+    args = parser.parse_args()
+
+    if args.backend == "local":
+        backend = LocalBackend()
+    else:
+        backend = ExtractTableBackend(st.secrets["EXTRACTTABLE_KEY"])
+
+    report = run(args.paths or find(args.root), backend, workers=args.workers, root=args.root)
+    print(report.to_string(index=False))
+
+    # Misread gamertags in what was just written are matched to known
+    # players (or flagged for review) in the shared alias table.
+    if report["Boxscore"].notna().any():
+        names.learn()
@@ -0,0 +1,105 @@
+import pandas as pd
+import streamlit as st
+import altair as alt
+
+import Home
+from ocr import REVIEW
+from compute import RUNS, aliases_path, read_aliases, read_runs
+
+
+def run_history(runs):
+    return pd.DataFrame.from_records(
+        [
+            {
+                "Started": r["Started"],
+                "Seconds": r["Seconds"],
+                "Stages": len(r["Stages"]),
+                "Latency": r.get("Latency"),
+            }
+            for r in runs
+        ]
+    )
+
+
+def stage_history(runs):
+    return pd.DataFrame.from_records(
+        [{"Started": r["Started"], **s} for r in runs for s in r["Stages"]]
+    )
+
+
+if __name__ == "__main__":
+    with open("style.css") as f:
+        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+
+    st.write("# Admin")
+
+    st.header("Query Cache")
+    st.table(pd.DataFrame([Home.cache_info()]))
+
+    st.header("Gamertags")
+    aliases = read_aliases()
+    review = aliases[aliases["Status"] == "review"].reset_index(drop=True)
+    if review.empty:
+        st.caption(f"{len(aliases)} alias(es) on file, none waiting on review.")
+    else:
+        st.warning(
+            f"{len(review)} gamertag(s) could belong to more than one player. Set their "
+            f"`Status` in `{aliases_path()}` to `confirmed` (with the right `Player`) or `distinct`."
+        )
+        st.table(review)
+
+    st.header("Quarter Lines")
+    conflicts = sorted(REVIEW.glob("*.csv"))
+    if not conflicts:
+        st.caption("No screenshot disagrees with the other team's screenshot of the same game.")
+    else:
+        st.warning(
+            f"{len(conflicts)} screenshot(s) read a game's quarter lines differently from the other "
+            f"team's. Correct the game file under `csv/` if it's wrong, then delete these from `{REVIEW}`."
+        )
+        for filename in conflicts:
+            st.caption(filename.stem)
+            st.table(pd.read_csv(filename))
+
+    runs = read_runs()
+    if not runs:
+        st.info(f"No pipeline runs have been recorded in `{RUNS}` yet.")
+        st.stop()
+
+    st.header("Pipeline Runs")
+    history = run_history(runs)
+    st.altair_chart(
+        alt.Chart(history)
+        .mark_line(point=True)
+        .encode(x="Started:T", y="Seconds:Q", tooltip=["Started", "Seconds", "Stages"]),
+        use_container_width=True,
+    )
+
+    latency = history.dropna(subset=["Latency"])
+    if not latency.empty:
+        st.subheader("Ingest Latency")
+        st.caption("Seconds from a file landing in `csv/` to its tables being published.")
+        st.altair_chart(
+            alt.Chart(latency)
+            .mark_line(point=True)
+            .encode(x="Started:T", y="Latency:Q", tooltip=["Started", "Latency"]),
+            use_container_width=True,
+        )
+
+    stages = stage_history(runs)
+    st.altair_chart(
+        alt.Chart(stages)
+        .mark_bar()
+        .encode(
+            x="Started:N",
+            y="sum(Seconds):Q",
+            color="Stage:N",
+            tooltip=["Started", "Season", "Stage", "Seconds", "RowsIn", "RowsOut", "PeakMB"],
+        ),
+        use_container_width=True,
+    )
+
+    started = st.selectbox("Run", list(reversed(history["Started"])))
+    run_df = stages[stages["Started"] == started].drop(columns=["Started"])
+    run_df = run_df.sort_values("Seconds", ascending=False).reset_index(drop=True)
+    st.dataframe(run_df.style.format({"Seconds": "{:.3f}", "PeakMB": "{:.1f}"}, na_rep=""))
@@ -1,18 +1,22 @@
 import json
-import pathlib
 
 import pandas as pd
 import streamlit as st
 import altair as alt
 
-from collections import defaultdict
+import Home
+from compute import holders
 
-CSV = pathlib.Path("csv")
 TEAM = "Blood Tigers"
 
+# Raw boxscore columns, in the order they appear in the source CSVs.
+BOXSCORE = ["Player", "PTS", "REB", "AST", "STL", "BLK", "FLS", "TO", "FGM", "FGA", "3PM", "3PA"]
+ADVANCED = ["Player", "eFG%", "USG%", "AST/TO", "PTS/100", "REB/100", "AST/100", "STL/100", "BLK/100"]
+ADVANCED_FORMAT = {c: "{:.2f}" for c in ADVANCED[1:]}
 
-def quarter_scoring(s, g):
-    data = pd.DataFrame(game(s, g)["breakdown"])
+
+def quarter_scoring(gdata):
+    data = pd.DataFrame(gdata["breakdown"])
     return (
         alt.Chart(data)
         .mark_bar()
@@ -24,121 +28,68 @@ def quarter_scoring(s, g):
     )
 
 
-def records(team):
-    made = []
-
-    recorded = {"PTS": 0, "3PM": 0, "REB": 0, "AST": 0, "STL": 0, "BLK": 0}
-    r_to_p = defaultdict(list)
-    for filename in (CSV / "s1" / "boxscores" / f"{team}").glob("*.csv"):
-        gdf = pd.read_csv(filename)
-        for k, v in recorded.items():
-            rdf = gdf.loc[gdf[k].idxmax()]
-            most = int(rdf[k])
-            if most > v:
-                recorded[k] = most
-                r_to_p[k] = [rdf["Player"]]
-            elif most == v:
-                r_to_p[k].append(rdf["Player"])
-
-    for k, v in recorded.items():
-        made.append({"Stat": k, "Player(s)": ", ".join(r_to_p[k]), "Record": v})
-
-    return pd.DataFrame.from_records(
-        made,
-        columns=[
-            "Stat",
-            "Player(s)",
-            "Record",
-        ],
-    )
+def payload(name, team, season, order=()):
+    # Only this team's rows are read (through each table's index on
+    # `Season, Team`) and cached.
+    return Home.read_rows(name, season, order=order, Team=team)
 
 
-def game(sc, gc):
-    with open(CSV / "s1" / "games.json", "r") as f:
-        return json.load(f)[str(sc)][str(gc)]
+def records(team, season):
+    return holders(payload("Records", team, season))
 
 
-def summary(team, season=1):
-    players = []
-    games = []
+def game(team, sc, gc):
+    entry = Home.read_rows("Catalog", sc, Team=team, Game=gc).iloc[0]
+    return {
+        "title": entry["Title"],
+        "stream": entry["Stream"],
+        "breakdown": json.loads(entry["Breakdown"]),
+        "boxscore": entry["Boxscore"],
+    }
 
-    made = []
-    for filename in (CSV / f"s{season}" / "boxscores" / f"{team}").glob("*.csv"):
-        gdf = pd.read_csv(filename)
-        games.append(gdf)
-        players.extend(gdf["Player"])
 
-    totals = pd.concat(games, axis=0, ignore_index=True)
-    for player in set(players):
-        games_played = players.count(player)
+def games(team, sc):
+    return list(payload("Catalog", team, sc, order=["Game"])["Game"])
 
-        fgm = float(totals.loc[totals["Player"] == player, "FGM"].sum())
-        fga = float(totals.loc[totals["Player"] == player, "FGA"].sum())
 
-        tpm = float(totals.loc[totals["Player"] == player, "3PM"].sum())
-        tpa = float(totals.loc[totals["Player"] == player, "3PA"].sum())
+def summary(team, season):
+    df = payload("Players", team, season)
+    return df.drop(columns=["Season", "Team"]).reset_index(drop=True)
 
-        made.append(
-            {
-                "Player": player,
-                "GP": games_played,
-                "FGM": fgm,
-                "FGA": fga,
-                "FG%": fgm / fga if fga else 0,
-                "3PM": tpm,
-                "3PA": tpa,
-                "3P%": tpm / tpa if tpa else 0,
-                "TRB": totals.loc[totals["Player"] == player, "REB"].sum()
-                / games_played,
-                "AST": totals.loc[totals["Player"] == player, "AST"].sum()
-                / games_played,
-                "STL": totals.loc[totals["Player"] == player, "STL"].sum()
-                / games_played,
-                "BLK": totals.loc[totals["Player"] == player, "BLK"].sum()
-                / games_played,
-                "TOV": totals.loc[totals["Player"] == player, "TO"].sum()
-                / games_played,
-                "PTS": totals.loc[totals["Player"] == player, "PTS"].sum()
-                / games_played,
-            },
-        )
 
-    return pd.DataFrame.from_records(
-        made,
-        columns=[
-            "Player",
-            "GP",
-            "FGM",
-            "FGA",
-            "FG%",
-            "3PM",
-            "3PA",
-            "3P%",
-            "TRB",
-            "AST",
-            "STL",
-            "BLK",
-            "TOV",
-            "PTS",
-        ],
-    )
+def advanced(team, season):
+    df = payload("Advanced", team, season)
+    return df.drop(columns=["Season", "Team"]).reset_index(drop=True)
 
 
-if __name__ == "__main__":
-    # st.set_page_config(layout="wide")
+def game_advanced(team, season, g):
+    df = Home.read_rows("GameAdvanced", season, Team=team, Game=g)
+    return df[ADVANCED].reset_index(drop=True)
+
+
+def rating_history(team, season):
+    return payload("RatingHistory", team, season, order=["Order"]).drop(columns=["Season"])
+
+
+def boxscores(team, season):
+    return payload("BoxscoreRows", team, season)
+
 
+def render(team, title=None, logo=None, replays=False):
     with open("style.css") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-    st.image(
-        "https://user-images.githubusercontent.com/8785025/179428151-7be15af8-bf02-42c1-8b77-37d4b4422a39.png"
-    )
+    if logo:
+        st.image(logo)
+
+    st.write(f"# {title or team}")
 
-    st.write(f"# Beantown Blood Tigers")
+    seasons = Home.get_seasons()
+    season = st.selectbox("Season", seasons, index=len(seasons) - 1)
 
     st.header("Season Totals")
 
-    df = summary(TEAM).sort_values(by=["PTS"], ascending=False)
+    df = summary(team, season).sort_values(by=["PTS"], ascending=False)
     st.dataframe(
         df.style.format(
             {
@@ -158,26 +109,55 @@ if __name__ == "__main__":
         )
     )
 
-    st.header("Replays and Boxscores")
+    st.subheader("Advanced")
+    st.dataframe(advanced(team, season).style.format(ADVANCED_FORMAT))
+    st.caption("Rates are per 100 team possessions; USG% is the share of them a player finished.")
+
+    st.header("Schedule")
+    Home.game_log(
+        f"schedule-{team}-{season}",
+        lambda before, limit: Home.get_schedule(team, season, before, limit),
+    )
 
-    # col1, col2 = st.columns(2)
-    # s = col1.selectbox('Season', [1])
+    history = rating_history(team, season)
+    if not history.empty:
+        st.subheader("Power Rating")
+        st.altair_chart(Home.rating_chart(history), use_container_width=True)
 
-    boxscores = sorted(list((CSV / f"s1" / "boxscores" / f"{TEAM}").glob("*.csv")))
-    games_list = [f.name.split(".")[0][1] for f in boxscores]
-    g = st.selectbox("Game", sorted(games_list))
+    st.header("Replays and Boxscores" if replays else "Boxscores")
 
-    gdata = game(1, g)
-    if gdata["stream"] != "":
-        st.video(gdata["stream"])
+    played = games(team, season)
+    if not played:
+        st.info(f"No games recorded for season {season}.")
     else:
-        st.markdown(f"##### *{gdata['title']}*")
-        st.warning(f"No stream available for game S{1}G{g}.")
+        box = boxscores(team, season)
+        g = st.selectbox("Game", played)
+
+        gdata = game(team, season, g)
+        if replays:
+            if gdata["stream"] != "":
+                st.video(gdata["stream"])
+            else:
+                st.markdown(f"##### *{gdata['title']}*")
+                st.warning(f"No stream available for game S{season}G{g}.")
 
-    st.table(pd.read_csv(list(boxscores)[int(g)-1]))
+        st.table(box.loc[box["Game"] == g, BOXSCORE].reset_index(drop=True))
+        st.table(game_advanced(team, season, g).style.format(ADVANCED_FORMAT))
 
-    breakdown = quarter_scoring(1, g)
-    st.altair_chart(breakdown, use_container_width=True)
+        if replays and gdata["breakdown"]:
+            breakdown = quarter_scoring(gdata)
+            st.altair_chart(breakdown, use_container_width=True)
 
     st.header("Single-Game Records")
-    st.table(records(TEAM))
+    st.table(records(team, season))
+
+
+if __name__ == "__main__":
+    # st.set_page_config(layout="wide")
+
+    render(
+        TEAM,
+        title="Beantown Blood Tigers",
+        logo="https://user-images.githubusercontent.com/8785025/179428151-7be15af8-bf02-42c1-8b77-37d4b4422a39.png",
+        replays=True,
+    )
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import create_engine
+
+import bench
+import compute
+
+
+@pytest.fixture
+def league(tmp_path, monkeypatch):
+    # A small generated league (see bench.generate) in place of `csv/`.
+    monkeypatch.setattr(compute, "DATA", tmp_path / "csv")
+    monkeypatch.setattr(compute, "BUILD", tmp_path / "build")
+    bench.generate(compute.DATA, teams=6, seasons=2, games=6)
+    return compute.DATA
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'test.sqlite3'}")
@@ -0,0 +1,92 @@
+import gzip
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import api
+import compute
+
+
+@pytest.fixture
+def server(league, engine, tmp_path):
+    compute.update(engine, 1, full=True)
+    httpd = api.serve(port=0, db=tmp_path / "test.sqlite3")
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(url, **headers):
+    # urllib raises on a 304; it's as much an answer as a 200 here.
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_accepts_gzip():
+    assert api.accepts_gzip("gzip, deflate")
+    assert api.accepts_gzip("br;q=1.0, gzip;q=0.5")
+    assert api.accepts_gzip("*")
+    assert not api.accepts_gzip("")
+    assert not api.accepts_gzip("gzip;q=0")
+    assert not api.accepts_gzip("*;q=0, br")
+
+
+def test_matches():
+    assert api.matches('"abc"', '"abc"')
+    assert api.matches('W/"abc"', '"abc"')
+    assert api.matches('"xyz", W/"abc"', '"abc"')
+    assert api.matches("*", '"abc"')
+    assert not api.matches('"abc-gz"', '"abc"')
+    assert not api.matches("", '"abc"')
+
+
+def test_revalidates_with_the_etag(server):
+    status, headers, body = get(f"{server}/players")
+    assert status == 200
+
+    status, headers, body = get(f"{server}/players", **{"If-None-Match": headers["ETag"]})
+    assert status == 304
+    assert body == b""
+    assert headers["ETag"] and headers["Vary"] == "Accept-Encoding"
+
+
+def test_each_encoding_has_its_own_etag(server):
+    status, plain, body = get(f"{server}/players")
+    status, packed, packed_body = get(f"{server}/players", **{"Accept-Encoding": "gzip"})
+
+    assert packed["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed_body) == body
+    assert packed["ETag"] != plain["ETag"]
+
+    # A tag for the compressed body doesn't validate the plain one.
+    status, headers, body = get(f"{server}/players", **{"If-None-Match": packed["ETag"]})
+    assert status == 200
+    status, headers, body = get(
+        f"{server}/players", **{"Accept-Encoding": "gzip;q=0", "If-None-Match": packed["ETag"]}
+    )
+    assert status == 200 and "Content-Encoding" not in headers
+
+    status, headers, body = get(
+        f"{server}/players",
+        **{"Accept-Encoding": "gzip", "If-None-Match": f'"stale", W/{packed["ETag"]}'},
+    )
+    assert status == 304
+
+
+def test_publish_changes_the_etag(server, league, engine):
+    status, before, body = get(f"{server}/players")
+
+    filename = sorted((league / "s1" / "boxscores" / "Team 01").glob("*.csv"))[0]
+    filename.write_text(filename.read_text().replace('"Team 01 P1","', '"Team 01 P1","1', 1))
+    compute.update(engine, 1)
+
+    status, headers, body = get(f"{server}/players", **{"If-None-Match": before["ETag"]})
+    assert status == 200
+    assert headers["ETag"] != before["ETag"]
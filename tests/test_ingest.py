@@ -0,0 +1,33 @@
+import time
+import threading
+
+import compute
+import ingest
+
+
+def test_upkeep_runs_off_the_batch(league, engine, monkeypatch):
+    learned = []
+    monkeypatch.setattr(ingest.names.Learner, "learn", lambda self, boxscores: learned.append(boxscores))
+
+    landed = time.time()
+    batch = {path: landed for path in (league / "s1" / "boxscores").glob("*/g1-*.csv")}
+    assert ingest.settle(engine, batch, {}) == {1}
+
+    # Published, but neither compacted nor matched yet.
+    assert not compute.read_state(engine, "Standings", 1).empty
+    assert not compute.store_is_fresh(1)
+    assert not learned
+
+    upkeep = ingest.Upkeep()
+    stop = threading.Event()
+    worker = threading.Thread(target=upkeep.run, args=(stop,))
+    worker.start()
+    upkeep.add({1}, batch)
+    deadline = time.time() + 30
+    while not learned and time.time() < deadline:
+        time.sleep(ingest.INTERVAL)
+    stop.set()
+    worker.join()
+
+    assert compute.store_is_fresh(1)
+    assert learned == [set(batch)]
@@ -0,0 +1,112 @@
+import pandas as pd
+
+import compute
+import names
+
+
+def box(*lines):
+    return pd.DataFrame(lines, columns=["Season", "Team", "Game", "Player"])
+
+
+def test_search_finds_close_tags():
+    index = names.NameIndex(["Splashbrother", "Dimes", "Glass Cleaner"])
+
+    assert index.search("Splashbr0ther") == [(1, "Splashbrother")]
+    assert index.search("Dlmes") == [(1, "Dimes")]
+    assert index.search("Nobody") == []
+
+
+def test_search_ignores_case():
+    index = names.NameIndex(["Dimes"])
+
+    assert index.search("DIMES") == [(0, "Dimes")]
+    assert index.search("Dimes") == []
+
+
+def test_misread_aliases_to_the_regular():
+    df = box(
+        (1, "Eagles", 1, "Dimes"),
+        (1, "Eagles", 2, "Dimes"),
+        (1, "Eagles", 3, "Dlmes"),
+    )
+    found = names.match(df, aliases=pd.DataFrame(columns=compute.ALIASES))
+
+    assert found.to_dict("records") == [{"Alias": "Dlmes", "Player": "Dimes", "Status": "auto"}]
+
+
+def test_teammates_are_never_aliased():
+    # Two tags in the same boxscore are two players, however close.
+    df = box(
+        (1, "Eagles", 1, "Dimes"),
+        (1, "Eagles", 1, "Dlmes"),
+        (1, "Eagles", 2, "Dimes"),
+    )
+    assert names.match(df, aliases=pd.DataFrame(columns=compute.ALIASES)).empty
+
+
+def test_close_tag_on_another_team_is_reviewed():
+    df = box(
+        (1, "Eagles", 1, "Dimes"),
+        (1, "Eagles", 2, "Dimes"),
+        (1, "Mudkats", 1, "Dlmes"),
+    )
+    found = names.match(df, aliases=pd.DataFrame(columns=compute.ALIASES))
+
+    assert list(found["Status"]) == ["review"]
+
+
+def test_alias_rebuild_keeps_held_files(league, engine):
+    compute.update(engine, 1, full=True)
+
+    filename = sorted((league / "s1" / "boxscores" / "Team 01").glob("*.csv"))[0]
+    path = compute.relpath(filename)
+    before = compute.read_boxscore(filename)
+    player = before["Player"][0]
+
+    # The file is edited but held back from publishing, then an alias
+    # renames one of its players, which rebuilds the season.
+    df = pd.read_csv(filename)
+    df.loc[0, "PTS"] += 50
+    df.to_csv(filename, index=False)
+    pd.DataFrame([{"Alias": player, "Player": "Renamed", "Status": "confirmed"}]).to_csv(
+        compute.aliases_path(), index=False
+    )
+    compute.update(engine, 1, hold={path})
+
+    rows = compute.read_rows(engine, "BoxscoreRows", [path])
+    assert list(rows["Player"]) == ["Renamed"] + list(before["Player"][1:])
+    assert list(rows["PTS"]) == list(before["PTS"])
+
+    sums = pd.read_sql_table("PlayerSums", engine)
+    assert player not in set(sums["Player"])
+    assert set(sums["Team"]) == set(compute.load_teams(1)["Team"])
+
+
+def test_learner_only_matches_landed_tags(league, monkeypatch):
+    boxscores = sorted((league / "s1" / "boxscores" / "Team 01").glob("*.csv"))
+    for filename in boxscores:
+        df = pd.read_csv(filename)
+        df.loc[0, "Player"] = "Splashbrother"
+        df.to_csv(filename, index=False)
+
+    learner = names.Learner()
+    learner.learn()
+    known = len(learner.index)
+
+    # A misread of a regular lands in a new boxscore.
+    df.loc[0, "Player"] = "Splashbr0ther"
+    landed = boxscores[0].with_name("g99-Team 02.csv")
+    df.to_csv(landed, index=False)
+
+    searched = []
+    search = names.NameIndex.search
+    monkeypatch.setattr(names.NameIndex, "search", lambda self, name: searched.append(name) or search(self, name))
+
+    found = learner.learn([landed])
+    assert searched == ["Splashbr0ther"]
+    assert found.to_dict("records") == [{"Alias": "Splashbr0ther", "Player": "Splashbrother", "Status": "auto"}]
+    assert len(learner.index) == known
+
+    # Already listed the second time round.
+    assert learner.learn([landed]).empty
+    assert searched == ["Splashbr0ther"]
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import compute
+import ocr
+
+BOX = [
+    ["Player", "PTS", "REB", "AST", "STL", "BLK", "FLS", "TO", "FGM/FGA", "3PM/3PA"],
+    ["Alpha", "2O", "5", "3", "1", "0", "2", "1", "8/15", "2/5"],
+    ["Bravo", "11", "7", "2", "0", "1", "3", "2", "5/9", "1/l"],
+    ["TOTAL", "31", "12", "5", "1", "1", "5", "3", "13/24", "3/6"],
+]
+
+
+def quarters(away, home):
+    return [
+        ["", "1st", "2nd", "3rd", "4th", "T"],
+        ["Eagles", *map(str, away), str(sum(away))],
+        ["Mudkats", *map(str, home), str(sum(home))],
+    ]
+
+
+@pytest.fixture
+def shots(tmp_path, monkeypatch):
+    monkeypatch.setattr(compute, "DATA", tmp_path / "csv")
+    monkeypatch.setattr(ocr, "CACHE", tmp_path / "ocr")
+    monkeypatch.setattr(ocr, "CLAIMS", tmp_path / "ocr" / "games.json")
+    monkeypatch.setattr(ocr, "REVIEW", tmp_path / "ocr" / "review")
+    return tmp_path / "screenshots"
+
+
+def screenshot(root, team, game, opponent, line):
+    # A stand-in image and the tables LocalBackend returns for it.
+    tables = [BOX, line]
+    filename = root / "s1" / team / f"g{game}-{opponent}.png"
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    filename.write_bytes(json.dumps([team, game, tables]).encode())
+    with open(filename.with_suffix(".json"), "w") as f:
+        json.dump(tables, f)
+    return filename
+
+
+def game_files():
+    return sorted(p.name for p in (compute.DATA / "s1" / "games").glob("*.csv"))
+
+
+def test_reads_boxscore_and_quarters(shots):
+    image = screenshot(shots, "Eagles", 1, "Mudkats", quarters([10, 12, 8, 15], [9, 9, 9, 9]))
+    report = ocr.run([image], ocr.LocalBackend(), root=shots)
+
+    assert list(report["Status"]) == ["extracted"]
+    box = compute.read_boxscore(compute.DATA / "s1" / "boxscores" / "Eagles" / "g1-Mudkats.csv")
+    assert list(box["Player"]) == ["Alpha", "Bravo"]
+    # OCR'd letters in digit columns are read as the digits they stand for.
+    assert list(box["PTS"]) == [20, 11]
+    assert list(box["3PA"]) == [5, 1]
+    assert game_files() == ["Eagles-Mudkats.csv"]
+
+
+def test_extracts_each_image_once(shots):
+    image = screenshot(shots, "Eagles", 1, "Mudkats", quarters([10, 12, 8, 15], [9, 9, 9, 9]))
+    copy = shots / "s1" / "Eagles" / "g1-Mudkats.jpg"
+    copy.write_bytes(image.read_bytes())
+
+    report = ocr.run([image, copy], ocr.LocalBackend(), root=shots)
+    assert sorted(report["Status"]) == ["duplicate", "extracted"]
+
+    report = ocr.run([image], ocr.LocalBackend(), root=shots)
+    assert list(report["Status"]) == ["cached"]
+
+
+def test_both_teams_share_one_game_file(shots):
+    line = quarters([10, 12, 8, 15], [9, 9, 9, 9])
+    ocr.run([screenshot(shots, "Eagles", 1, "Mudkats", line)], ocr.LocalBackend(), root=shots)
+    report = ocr.run([screenshot(shots, "Mudkats", 1, "Eagles", line)], ocr.LocalBackend(), root=shots)
+
+    assert list(report["Status"]) == ["extracted"]
+    assert game_files() == ["Eagles-Mudkats.csv"]
+
+
+def test_disagreeing_read_goes_to_review(shots):
+    ocr.run(
+        [screenshot(shots, "Eagles", 1, "Mudkats", quarters([10, 12, 8, 15], [9, 9, 9, 9]))],
+        ocr.LocalBackend(),
+        root=shots,
+    )
+    # The other side's screenshot misreads one quarter.
+    report = ocr.run(
+        [screenshot(shots, "Mudkats", 1, "Eagles", quarters([10, 12, 8, 16], [9, 9, 9, 9]))],
+        ocr.LocalBackend(),
+        root=shots,
+    )
+
+    assert report["Status"][0].startswith("review:")
+    assert game_files() == ["Eagles-Mudkats.csv"]
+    assert [p.name for p in ocr.REVIEW.iterdir()] == ["s1-Mudkats-g1.csv"]
+
+
+def test_rematch_gets_its_own_game_file(shots):
+    ocr.run(
+        [screenshot(shots, "Eagles", 1, "Mudkats", quarters([10, 12, 8, 15], [9, 9, 9, 9]))],
+        ocr.LocalBackend(),
+        root=shots,
+    )
+    report = ocr.run(
+        [screenshot(shots, "Eagles", 2, "Mudkats", quarters([5, 5, 5, 5], [6, 6, 6, 6]))],
+        ocr.LocalBackend(),
+        root=shots,
+    )
+
+    assert list(report["Status"]) == ["extracted"]
+    assert game_files() == ["Eagles-Mudkats-2.csv", "Eagles-Mudkats.csv"]
@@ -0,0 +1,66 @@
+import math
+
+import pandas as pd
+
+import compute
+
+
+def starts(engine, season):
+    history = compute.read_state(engine, "RatingHistory", season)
+    first = history.sort_values("Order").drop_duplicates("Team")
+    return dict(zip(first["Team"], first["Before"]))
+
+
+def test_carry_over_pulls_toward_the_mean():
+    ratings = pd.DataFrame({"Team": ["A", "B"], "Elo": [1600.0, 1400.0]})
+
+    assert compute.carry_over(ratings) == {"A": 1575.0, "B": 1425.0}
+    assert compute.carry_over(None) == {}
+
+
+def test_season_starts_from_last_seasons_ratings(league, engine):
+    compute.update(engine, 1, full=True)
+    compute.update(engine, 2, full=True)
+
+    carried = compute.carry_over(compute.read_state(engine, "Ratings", 1))
+    assert any(not math.isclose(elo, compute.ELO_MEAN) for elo in carried.values())
+    for team, before in starts(engine, 2).items():
+        assert math.isclose(before, carried[team])
+
+
+def test_new_games_extend_the_history():
+    log = pd.DataFrame({
+        "Order": [1, 2, 3],
+        "Date": ["2022-01-01", "2022-01-02", "2022-01-03"],
+        "Away": ["A", "B", "A"],
+        "Home": ["B", "C", "C"],
+        "AScore": [50, 40, 61],
+        "HScore": [45, 44, 60],
+        "Winner": ["A", "C", "A"],
+        "Margin": [5, 4, 1],
+    })
+    start = {"A": 1550.0}
+
+    previous = compute.rate(log[log["Order"] <= 2], start)
+    pd.testing.assert_frame_equal(compute.rate(log, start, previous), compute.rate(log, start))
+
+    # A different start replays the season rather than extending it.
+    pd.testing.assert_frame_equal(compute.rate(log, {}, previous), compute.rate(log))
+
+
+def test_republished_season_re_rates_the_next(league, engine):
+    compute.update(engine, 1, full=True)
+    compute.update(engine, 2, full=True)
+
+    # A late result changes how season 1 ended; season 2's files don't move.
+    filename = sorted((league / "s1" / "games").glob("*.csv"))[-1]
+    df = pd.read_csv(filename)
+    df.loc[0, ["4th", "Total"]] += 60
+    df.to_csv(filename, index=False)
+    compute.update(engine, 1)
+
+    assert compute.update(engine, 2) is not None
+    carried = compute.carry_over(compute.read_state(engine, "Ratings", 1))
+    for team, before in starts(engine, 2).items():
+        assert math.isclose(before, carried[team])
+    assert compute.update(engine, 2) is None
@@ -0,0 +1,111 @@
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+
+import compute
+
+# Keyed by surrogate ids or file metadata that differ between databases.
+SKIP = {"Gamertags", "PlayerGames", "Manifest"}
+
+
+def published(engine):
+    made = {}
+    for name in sorted(set(inspect(engine).get_table_names()) - SKIP) + ["BoxscoreRows"]:
+        df = pd.read_sql_table(name, engine)
+        made[name] = df.sort_values(list(df.columns)).reset_index(drop=True)
+    return made
+
+
+def assert_same(a, b):
+    assert sorted(a) == sorted(b)
+    for name in a:
+        pd.testing.assert_frame_equal(a[name], b[name][a[name].columns], check_dtype=False, obj=name)
+
+
+def test_fold_adds_and_subtracts():
+    by = ["Team"]
+    sums = pd.DataFrame({"Team": ["A", "B"], "GP": [2, 1], "PTS": [40, 15]})
+    removed = pd.DataFrame({"Team": ["A", "B"], "GP": [1, 1], "PTS": [25, 15]})
+    added = pd.DataFrame({"Team": ["A", "C"], "GP": [1, 1], "PTS": [30, 12]})
+
+    df = compute.fold(sums, removed, added, by).sort_values("Team").reset_index(drop=True)
+
+    # B lost its only game and drops out.
+    assert df.to_dict("records") == [
+        {"Team": "A", "GP": 2, "PTS": 45},
+        {"Team": "C", "GP": 1, "PTS": 12},
+    ]
+
+
+def test_nothing_changed_publishes_nothing(league, engine):
+    compute.update(engine, 1, full=True)
+    assert compute.update(engine, 1) is None
+
+
+def test_incremental_matches_full(league, engine, tmp_path):
+    compute.update(engine, 1, full=True)
+
+    boxscores = league / "s1" / "boxscores"
+    edited = sorted((boxscores / "Team 01").glob("*.csv"))[0]
+    df = pd.read_csv(edited)
+    df.loc[0, ["PTS", "FGM", "FGA"]] += [40, 20, 20]
+    df.to_csv(edited, index=False)
+    sorted((boxscores / "Team 02").glob("*.csv"))[-1].unlink()
+
+    report = compute.update(engine, 1).set_index("Stage")
+
+    full = create_engine(f"sqlite:///{tmp_path / 'full.sqlite3'}")
+    compute.update(full, 1, full=True)
+    assert_same(published(engine), published(full))
+
+    # Only the two teams whose boxscores changed were restaged.
+    rows = pd.read_sql_table("GameAdvanced", engine)
+    assert report.loc["to_sql:GameAdvanced", "RowsOut"] == rows["Team"].isin(["Team 01", "Team 02"]).sum()
+
+
+def test_late_game_restages_log_from_its_date(league, engine, tmp_path):
+    compute.update(engine, 1, full=True)
+
+    # A game dated before the rest of the season renumbers every game.
+    games = league / "s1" / "games"
+    early = games / "Team 04-Team 05-9.csv"
+    early.write_text((games / sorted(p.name for p in games.glob("*.csv"))[0]).read_text())
+    dates = pd.read_csv(league / "s1" / "dates.csv")
+    dates.loc[len(dates)] = ["Team 04-Team 05-9", "2020-01-01"]
+    dates.to_csv(league / "s1" / "dates.csv", index=False)
+
+    report = compute.update(engine, 1).set_index("Stage")
+
+    full = create_engine(f"sqlite:///{tmp_path / 'full.sqlite3'}")
+    compute.update(full, 1, full=True)
+    assert_same(published(engine), published(full))
+    assert report.loc["to_sql:Games", "RowsOut"] == len(pd.read_sql_table("Games", engine))
+
+
+def test_empty_season_publishes(league, engine, tmp_path):
+    # A new season starts with only its teams.
+    (league / "s3").mkdir()
+    (league / "s3" / "teams.csv").write_text((league / "s1" / "teams.csv").read_text())
+    teams = len(compute.load_teams(3))
+
+    compute.update(engine, 2, full=True)
+    compute.compact(3)
+    compute.update(engine, 3, full=True)
+
+    standings = compute.read_state(engine, "Standings", 3)
+    assert len(standings) == teams and (standings["GP"] == 0).all()
+    assert len(compute.read_state(engine, "Odds", 3)) == teams
+    assert compute.read_state(engine, "Leaders", 3).empty
+    assert compute.read_state(engine, "Players", 3).empty
+
+    # Then its first game lands.
+    for kind, pattern in [("boxscores", "Team 01/g1-*.csv"), ("games", "*.csv")]:
+        source = sorted((league / "s2" / kind).glob(pattern))[0]
+        target = league / "s3" / kind / source.relative_to(league / "s2" / kind)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(source.read_bytes())
+    compute.update(engine, 3)
+
+    full = create_engine(f"sqlite:///{tmp_path / 'full.sqlite3'}")
+    for season in [2, 3]:
+        compute.update(full, season, full=True)
+    assert_same(published(engine), published(full))